@@ -0,0 +1,1951 @@
+# -----------------------------------------------------------------------------
+# Newspaper
+# Copyright (C) 2019-2002 - Grum999
+# -----------------------------------------------------------------------------
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# https://spdx.org/licenses/GPL-3.0-or-later.html
+# -----------------------------------------------------------------------------
+# A Krita plugin designed to apply a "newspaper" style to a layer
+# . Monochrome
+# . Four color (CMYK)
+# -----------------------------------------------------------------------------
+# Halftone engine
+# . Pixels: conversion of Krita RGBA pixels data, whatever the color depth is
+# . Sampling: calculate dots coverage from source pixels
+#   (summed area tables are used to get average value of cells, empty areas of
+#   image are skipped)
+# . Separation: layers operations (composition, desaturation) made on pixels
+#   arrays, to separate colors without intermediate layers; layers processes
+#   are compiled into an execution plan in which shared results are calculated
+#   once
+# . Jitter: reproducible random variations of dots, for steadiness
+# . Rendering: paint dots, optionally split in strips painted by worker threads
+#   (dots without steadiness variation are stamped from pre-rendered sprites)
+# . Screening: threshold array halftone (AM screening), alternative to sampling
+#   and rendering
+#
+# Module doesn't depend on Krita API, only on PyQt5 (and NumPy when available)
+# -----------------------------------------------------------------------------
+
+from concurrent.futures import (
+        ThreadPoolExecutor,
+        FIRST_COMPLETED,
+        wait
+    )
+from itertools import groupby
+from math import (
+        ceil,
+        cos,
+        radians,
+        sin,
+        sqrt
+    )
+import re
+from struct import (
+        pack,
+        unpack
+    )
+from threading import Lock
+
+from PyQt5.QtCore import (
+        Qt,
+        QByteArray,
+        QLineF,
+        QPointF,
+        QRect,
+        QRectF,
+        QThread
+    )
+from PyQt5.QtGui import (
+        QBrush,
+        QColor,
+        QImage,
+        QPainter,
+        QPen,
+        QPolygonF
+    )
+
+try:
+    # NumPy is not always provided with Krita
+    # when not available, a (slower) pure python implementation is used
+    import numpy
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+
+class HalftonePixels:
+    """Convert RGBA pixels data, as provided by Krita pixelData(), to/from
+    arrays and images (NumPy only)
+
+    Source images for halftone are ARGB32 QImage (8bits layers) or, for layers
+    with higher color depth, (height, width, 4) float arrays of BGRA values in
+    range [0.0, 255.0] on which sampling is made without quantization
+
+    Values are sampled like 8bits values, without color conversion: then
+    only color profiles with a sRGB tone response curve are supported (float
+    layers usually use linear profiles, for which values must be converted)
+    """
+
+    # color depths for which pixels data can be converted
+    # (Krita stores integer values as BGRA, and float values as RGBA)
+    # key = color depth, value = (numpy type, values stored as RGBA, maximum value)
+    COLOR_DEPTHS = {
+            'U8': ('uint8', False, 255),
+            'U16': ('uint16', False, 65535),
+            'F16': ('float16', True, 1.0),
+            'F32': ('float32', True, 1.0)
+        }
+
+    @staticmethod
+    def isSupported(colorModel, colorDepth, colorProfile):
+        """Return True if pixels data for given color space can be converted"""
+        return (NUMPY_AVAILABLE and
+                colorModel == 'RGBA' and
+                colorDepth in HalftonePixels.COLOR_DEPTHS and
+                ('srgbtrc' in colorProfile.lower() or colorProfile == 'sRGB built-in'))
+
+    @staticmethod
+    def toArray(data, width, height, colorDepth):
+        """Return given pixels data (a QByteArray) as a (height, width, 4) array
+        of BGRA float values in range [0.0, 255.0]"""
+        dtype, isRgba, maxValue = HalftonePixels.COLOR_DEPTHS[colorDepth]
+
+        returned = numpy.frombuffer(data, dtype=dtype).reshape(height, width, 4).astype(numpy.float64)
+        if isRgba:
+            returned = returned[:, :, [2, 1, 0, 3]]
+        returned *= 255 / maxValue
+        # float values can be out of range
+        return numpy.clip(returned, 0, 255, out=returned)
+
+    @staticmethod
+    def fromImage(image, colorDepth):
+        """Return pixels data (a QByteArray) of given QImage, for given color depth"""
+        dtype, isRgba, maxValue = HalftonePixels.COLOR_DEPTHS[colorDepth]
+
+        if image.format() != QImage.Format_ARGB32:
+            # Krita expect non premultiplied pixels
+            image = image.convertToFormat(QImage.Format_ARGB32)
+        values = HalftoneSampler.imageArray(image)
+        if isRgba:
+            values = values[:, :, [2, 1, 0, 3]]
+
+        returned = QByteArray(image.width() * image.height() * 4 * numpy.dtype(dtype).itemsize, b'\0')
+        # QByteArray buffer is written directly, without intermediate bytes
+        returnedArray = numpy.frombuffer(memoryview(returned), dtype=dtype).reshape(values.shape)
+        if isRgba:
+            returnedArray[:] = values / 255
+        else:
+            # 255 * 257 = 65535
+            returnedArray[:] = values.astype(dtype) * (maxValue // 255)
+        return returned
+
+
+class HalftoneSampler:
+    """Calculate, for each cell of halftone lattice, the dot coverage
+
+    Coverage is a value in range [0.0, 1.0] (0.0 = no dot, 1.0 = full dot)
+    calculated from alpha weighted gray value of source pixels
+
+    Source image is an ARGB32 QImage, or a float array provided by
+    HalftonePixels.toArray() (NumPy only)
+    """
+
+    SAMPLING_LOW = 0        # sample made on current pixel only
+    SAMPLING_MEDIUM = 1     # sample made on one pixel on two
+    SAMPLING_HIGH = 2       # sample made on ALL pixel
+
+    # size, in pixels, of tiles for occupancy mask
+    OCCUPANCY_TILE_SIZE = 32
+
+    @staticmethod
+    def transform(x, y, matrix):
+        """Calculate new coordinates according to given transformation matrix"""
+        xt = x - matrix[0][2]
+        yt = y - matrix[1][2]
+        return (xt * matrix[0][0] + yt * matrix[0][1] + matrix[0][2],
+                xt * matrix[1][0] + yt * matrix[1][1] + matrix[1][2])
+
+    @staticmethod
+    def samplingRange(sampling, dotiSize):
+        """Return offsets of pixels to sample in a cell, or None if only current pixel is sampled"""
+        if sampling == HalftoneSampler.SAMPLING_HIGH:
+            return [v for v in range(0, dotiSize, 1)]
+        elif sampling == HalftoneSampler.SAMPLING_MEDIUM:
+            return [v for v in range(0, dotiSize, 2)]
+        return None
+
+    @staticmethod
+    def validBounds(width, height, dotiSize, sampling):
+        """Return (xMin, xMax, yMin, yMax) open bounds of source coordinates
+        for which a lattice cell intersects the image
+
+        Cells are identified by truncated coordinates, then bounds are shifted
+        by one pixel
+        """
+        if sampling == HalftoneSampler.SAMPLING_LOW:
+            # only current pixel: must be inside image
+            return (-1, width, -1, height)
+        # cell [i, i + dotiSize[ must intersect image
+        return (-dotiSize - 1, width + 1, -dotiSize - 1, height + 1)
+
+    @staticmethod
+    def latticeSpans(xPositions, yPositions, transformMatrix, bounds):
+        """Return, for each lattice column, the (start, end) range of row
+        indexes for which transformed positions are inside given bounds
+
+        A column of the rotated lattice is a straight line in source image, then
+        range is calculated analytically instead of checking all positions;
+        range is extended by one position on each side to be safe against
+        rounding, and positions still have to be checked individually
+        """
+        xMin, xMax, yMin, yMax = bounds
+        nbRows = len(yPositions)
+
+        if nbRows < 2:
+            return [(0, nbRows)] * len(xPositions)
+
+        yTop = yPositions[0]
+        dotOffset = (yPositions[-1] - yTop) / (nbRows - 1)
+
+        if transformMatrix is None:
+            matrix = [[1, 0, 0], [0, 1, 0]]
+        else:
+            matrix = transformMatrix
+
+        # move along a column: fixed direction in source image
+        dX = dotOffset * matrix[0][1]
+        dY = dotOffset * matrix[1][1]
+
+        def axisRange(origin, delta, vMin, vMax):
+            # range of j for which vMin < origin + j * delta < vMax
+            if abs(delta) < 1e-9:
+                # column is parallel to axis (with a margin, as for range)
+                if vMin - 1 < origin < vMax + 1:
+                    return (0, nbRows)
+                return (0, 0)
+            jA = (vMin - origin) / delta
+            jB = (vMax - origin) / delta
+            if jA > jB:
+                jA, jB = jB, jA
+            return (int(jA // 1) - 1, int(jB // 1) + 2)
+
+        returned = []
+        for x in xPositions:
+            xt = x - matrix[0][2]
+            yt = yTop - matrix[1][2]
+            originX = xt * matrix[0][0] + yt * matrix[0][1] + matrix[0][2]
+            originY = xt * matrix[1][0] + yt * matrix[1][1] + matrix[1][2]
+
+            startX, endX = axisRange(originX, dX, xMin, xMax)
+            startY, endY = axisRange(originY, dY, yMin, yMax)
+
+            start = max(0, startX, startY)
+            end = min(nbRows, endX, endY)
+            if end <= start:
+                returned.append((0, 0))
+            else:
+                returned.append((start, end))
+        return returned
+
+    @staticmethod
+    def imageSize(imgSrc):
+        """Return (width, height) of given source image"""
+        if isinstance(imgSrc, QImage):
+            return (imgSrc.width(), imgSrc.height())
+        return (imgSrc.shape[1], imgSrc.shape[0])
+
+    @staticmethod
+    def occupancy(imgSrc, inkOnly, desaturate=None):
+        """Return occupancy mask of given image (NumPy only)
+
+        Returned value is a 2D boolean array, one value per tile of
+        OCCUPANCY_TILE_SIZE pixels: tile is occupied if at least one of its
+        pixels is visible (alpha > 0), and not opaque white if `inkOnly` is True
+
+        If `desaturate` type is provided, image is not a gray image
+
+        Cells that are only over empty tiles are skipped without being
+        sampled: pixels of an empty tile are fully transparent, or opaque white
+        if `inkOnly` is True, then they provide no dot whatever the desaturate
+        type is
+        """
+        imgSrcArray = HalftoneSampler.imageArray(imgSrc)
+        occupied = (imgSrcArray[:, :, 3] > 0)
+        if inkOnly:
+            # work on 1byte only (all RGB byte have same value)
+            # note: in SAMPLING_LOW mode, a partially transparent white pixel
+            #       provides a dot, then it's not considered as empty
+            if desaturate is None:
+                occupied &= (imgSrcArray[:, :, 0] < 255) | (imgSrcArray[:, :, 3] < 255)
+            else:
+                # only opaque pixels for which all channels are white are
+                # empty: they provide a white gray value for every desaturate
+                # type
+                # others pixels are occupied, even if they can provide a white
+                # gray value (with DESATURATE_MAXIMUM, gray value is the one of
+                # the highest channel)
+                occupied &= (imgSrcArray[:, :, :3] < 255).any(axis=2) | (imgSrcArray[:, :, 3] < 255)
+
+        tileSize = HalftoneSampler.OCCUPANCY_TILE_SIZE
+        height, width = occupied.shape
+        tilesHeight = ceil(height / tileSize)
+        tilesWidth = ceil(width / tileSize)
+
+        tiles = numpy.zeros((tilesHeight * tileSize, tilesWidth * tileSize), dtype=bool)
+        tiles[:height, :width] = occupied
+        return tiles.reshape(tilesHeight, tileSize, tilesWidth, tileSize).any(axis=(1, 3))
+
+    @staticmethod
+    def occupiedCells(occupancy, iX, iY, size, width, height):
+        """Return a boolean array, True for cells (iX, iY, size, size) that are
+        over at least one occupied tile of given `occupancy` mask
+        """
+        tileSize = HalftoneSampler.OCCUPANCY_TILE_SIZE
+        table = HalftoneSampler.summedAreaTable(occupancy.astype(numpy.int32))
+
+        x0 = numpy.clip(iX, 0, width) // tileSize
+        x1 = (numpy.clip(iX + size, 0, width) + tileSize - 1) // tileSize
+        y0 = numpy.clip(iY, 0, height) // tileSize
+        y1 = (numpy.clip(iY + size, 0, height) + tileSize - 1) // tileSize
+
+        return (table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0]) > 0
+
+    @staticmethod
+    def sample(imgSrc, xPositions, yPositions, transformMatrix, dotiSize, sampling, occupancy=None, desaturate=None):
+        """Return dots for given lattice positions
+
+        Returned value is a tuple (x, y, coverage) of 3 sequences of same size;
+        only dots for which something has to be drawn are returned, ordered like
+        lattice positions (columns first)
+
+        If `occupancy` mask is provided (see occupancy()), cells over empty
+        tiles are ignored
+
+        If a `desaturate` type is provided (see HalftoneSeparation), image is
+        not a gray image: gray values are calculated from pixels while they're
+        sampled, instead of applying a desaturate filter on image
+
+        If NumPy is available, sequences are numpy arrays, otherwise list
+        """
+        if NUMPY_AVAILABLE or not isinstance(imgSrc, QImage):
+            return HalftoneSampler.sampleNumPy(imgSrc, xPositions, yPositions, transformMatrix, dotiSize, sampling, occupancy, desaturate)
+        return HalftoneSampler.samplePython(imgSrc, xPositions, yPositions, transformMatrix, dotiSize, sampling, desaturate)
+
+    @staticmethod
+    def samplePython(imgSrc, xPositions, yPositions, transformMatrix, dotiSize, sampling, desaturate=None):
+        """Pure python implementation of sample()"""
+        # note:
+        # as python is slow, code in this function is made in a way that is
+        # not intuitive for a python programmer
+        # - use array instead of range (faster)
+        # - work on bits array instead of pixel object (faster)
+        # - use of many [configuration] variables instead of dictionnary (faster)
+        # - ...
+        transform = HalftoneSampler.transform
+
+        configWidth = imgSrc.width()
+        configHeight = imgSrc.height()
+        configSamplingRange = HalftoneSampler.samplingRange(sampling, dotiSize)
+        configSampling = (configSamplingRange is not None)
+
+        mWidth = configWidth + dotiSize
+        mHeight = configHeight + dotiSize
+
+        returnedX = []
+        returnedY = []
+        returnedRadius = []
+
+        # working on bits() is faster than working on pixels
+        # (constBits(): no detach of image data shared with Krita)
+        # pixel is stored on 4bytes:
+        # Bits[index] = blue
+        # Bits[index + 1] = green
+        # Bits[index + 2] = red
+        # Bits[index + 3] = alpha
+        imgSrcBits = imgSrc.constBits()
+        imgSrcBits.setsize(imgSrc.byteCount())
+        imgSrcBitsRowLength = configWidth << 2  # << 2 = *4 but faster
+
+        if desaturate is None:
+            grayPixel = None
+        else:
+            grayPixel = HalftoneSeparation.grayFunction(desaturate)
+
+        # only lattice positions that may be inside image are checked
+        spans = HalftoneSampler.latticeSpans(xPositions, yPositions, transformMatrix,
+                                             HalftoneSampler.validBounds(configWidth, configHeight, dotiSize, sampling))
+
+        for x, span in zip(xPositions, spans):
+            for y in yPositions[span[0]:span[1]]:
+
+                if transformMatrix is None:
+                    # avoid heavy calculations...
+                    iXSrc, iYSrc = int(x), int(y)
+                    fXSrc, fYSrc = x, y
+                else:
+                    fXSrc, fYSrc = transform(x, y, transformMatrix)
+
+                    iXSrc = int(fXSrc)
+                    iYSrc = int(fYSrc)
+
+                if (configSampling and
+                    (iXSrc + dotiSize > mWidth or
+                     iYSrc + dotiSize > mHeight or
+                     iXSrc < -dotiSize or
+                     iYSrc < -dotiSize) or
+                    not configSampling and
+                    (iXSrc < 0 or
+                     iYSrc < 0 or
+                     iXSrc >= configWidth or
+                     iYSrc >= configHeight)):
+                    # completely outside viewport, do not process
+                    continue
+
+                # retrieve cell area pixels
+                if configSampling:
+                    # do an average calculation of all pixels in area to determinate dot size
+                    sumPx = 0
+                    nbPx = 0
+                    for tx in configSamplingRange:
+                        gX = iXSrc + tx
+                        if gX < 0 or gX >= configWidth:
+                            continue
+
+                        for ty in configSamplingRange:
+                            gY = iYSrc + ty
+                            if gY < 0 or gY >= configHeight:
+                                continue
+                            # use 'x << 2' instead of 'x * 4'
+                            # because bitwise operation is faster
+                            imgSrcBitsIndex = gY * imgSrcBitsRowLength + (gX << 2)
+
+                            alpha = ord(imgSrcBits[imgSrcBitsIndex + 3])
+                            if alpha == 0:
+                                # fully transparent
+                                continue
+                            elif grayPixel is None:
+                                # work on 1byte only (all RGB byte have same value)
+                                value = ord(imgSrcBits[imgSrcBitsIndex])
+                            else:
+                                value = grayPixel(ord(imgSrcBits[imgSrcBitsIndex]), ord(imgSrcBits[imgSrcBitsIndex + 1]), ord(imgSrcBits[imgSrcBitsIndex + 2]))
+
+                            if alpha == 0xFF:
+                                # no alpha, get value
+                                sumPx += value
+                                nbPx += 1
+                            else:
+                                # alpha, get weighted value
+                                sumPx += 255 - int((255 - value) * alpha/255)
+                                nbPx += 1
+                    if nbPx > 0:
+                        # some pixels have been processed
+                        fRadius = (255-sumPx/nbPx)/255
+                    else:
+                        # nothing to process
+                        continue
+                else:
+                    # no sampling, only based on current pixel value
+
+                    # use 'x << 2' instead of 'x * 4'
+                    # because bitwise operation is faster
+                    imgSrcBitsIndex = iYSrc * imgSrcBitsRowLength + (iXSrc << 2)
+
+                    alpha = ord(imgSrcBits[imgSrcBitsIndex + 3])
+
+                    if alpha == 0:
+                        # completely transparent, do nothing and process next pixel
+                        continue
+                    elif grayPixel is None:
+                        value = ord(imgSrcBits[imgSrcBitsIndex])
+                    else:
+                        value = grayPixel(ord(imgSrcBits[imgSrcBitsIndex]), ord(imgSrcBits[imgSrcBitsIndex + 1]), ord(imgSrcBits[imgSrcBitsIndex + 2]))
+
+                    if alpha == 0xFF:
+                        # no transparency, get current value
+                        fRadius = (255 - value) / 255
+                    else:
+                        # with transparency, apply alpha weight
+                        # fRadius2 = (255 - (255 - value) * alpha/255)/255
+                        # factorized calculation
+                        fRadius = (65025 + (value - 255) * alpha)/65025
+
+                returnedX.append(fXSrc)
+                returnedY.append(fYSrc)
+                returnedRadius.append(fRadius)
+
+        return (returnedX, returnedY, returnedRadius)
+
+    @staticmethod
+    def imageArray(imgSrc, writable=False):
+        """Return a (height, width, 4) numpy array view (BGRA) on given ARGB32 QImage
+
+        Unless `writable` is True, returned view is read-only: image data are
+        not detached (copied) if shared
+
+        If given image is already an array, it's returned as is
+        """
+        if not isinstance(imgSrc, QImage):
+            return imgSrc
+        elif writable:
+            imgSrcBits = imgSrc.bits()
+        else:
+            imgSrcBits = imgSrc.constBits()
+        imgSrcBits.setsize(imgSrc.byteCount())
+
+        return numpy.frombuffer(imgSrcBits, dtype=numpy.uint8).reshape(imgSrc.height(), imgSrc.bytesPerLine())[:, :imgSrc.width() << 2].reshape(imgSrc.height(), imgSrc.width(), 4)
+
+    @staticmethod
+    def summedAreaTable(values):
+        """Return summed area table (integral image) for given 2D array
+
+        Returned table have an additional first row and first column of zero:
+            table[y, x] = sum of values[0:y, 0:x]
+        """
+        height, width = values.shape
+        if values.dtype.kind == 'f':
+            dtype = numpy.float64
+        elif width * height * int(values.max(initial=0)) < 0x7FFFFFFF:
+            # smaller table is faster to build and to read
+            dtype = numpy.int32
+        else:
+            dtype = numpy.int64
+
+        returned = numpy.zeros((height + 1, width + 1), dtype=dtype)
+        numpy.cumsum(values, axis=0, dtype=dtype, out=returned[1:, 1:])
+        numpy.cumsum(returned[1:, 1:], axis=1, dtype=dtype, out=returned[1:, 1:])
+        return returned
+
+    @staticmethod
+    def cellsSum(table, iX, iY, size):
+        """Return sum of values of cells (iX, iY, size, size) from given summed area table
+
+        Cells are clipped to table bounds; whatever the cell size is, sum is
+        obtained with 4 lookups
+        """
+        height = table.shape[0] - 1
+        width = table.shape[1] - 1
+
+        x0 = numpy.clip(iX, 0, width)
+        x1 = numpy.clip(iX + size, 0, width)
+        y0 = numpy.clip(iY, 0, height)
+        y1 = numpy.clip(iY + size, 0, height)
+
+        if table.dtype.kind == 'f':
+            return (table[y1, x1] - table[y0, x1] - table[y1, x0] + table[y0, x0])
+        return (table[y1, x1].astype(numpy.int64) - table[y0, x1] - table[y1, x0] + table[y0, x0])
+
+    @staticmethod
+    def sampleNumPy(imgSrc, xPositions, yPositions, transformMatrix, dotiSize, sampling, occupancy=None, desaturate=None):
+        """NumPy implementation of sample()
+
+        All lattice cells are processed in bulk; results are strictly identical
+        to samplePython() results (except ignored cells over empty tiles)
+
+        Float arrays are sampled with the same formulas, without rounding
+        """
+        configWidth, configHeight = HalftoneSampler.imageSize(imgSrc)
+        configSamplingRange = HalftoneSampler.samplingRange(sampling, dotiSize)
+
+        imgSrcArray = HalftoneSampler.imageArray(imgSrc)
+        if desaturate is None:
+            # work on 1byte only (all RGB byte have same value)
+            imgValue = imgSrcArray[:, :, 0]
+        elif configSamplingRange is not None:
+            # all pixels are sampled
+            imgValue = HalftoneSeparation.gray(imgSrcArray, desaturate)
+        imgAlpha = imgSrcArray[:, :, 3]
+        if imgSrcArray.dtype.kind == 'f':
+            valuesType = numpy.float64
+        else:
+            valuesType = numpy.int64
+
+        # lattice positions, ordered like python implementation (columns first)
+        # only positions that may be inside image are built
+        spans = numpy.array(HalftoneSampler.latticeSpans(xPositions, yPositions, transformMatrix,
+                                                         HalftoneSampler.validBounds(configWidth, configHeight, dotiSize, sampling)),
+                            dtype=numpy.int64).reshape(-1, 2)
+        spansLength = spans[:, 1] - spans[:, 0]
+        # for each position: column index, then row index from span start
+        columns = numpy.repeat(numpy.arange(len(spansLength)), spansLength)
+        rows = numpy.arange(int(spansLength.sum())) - numpy.repeat(numpy.cumsum(spansLength) - spansLength - spans[:, 0], spansLength)
+
+        fXSrc = numpy.array(xPositions, dtype=numpy.float64)[columns]
+        fYSrc = numpy.array(yPositions, dtype=numpy.float64)[rows]
+
+        if transformMatrix is not None:
+            xt = fXSrc - transformMatrix[0][2]
+            yt = fYSrc - transformMatrix[1][2]
+            fXSrc = xt * transformMatrix[0][0] + yt * transformMatrix[0][1] + transformMatrix[0][2]
+            fYSrc = xt * transformMatrix[1][0] + yt * transformMatrix[1][1] + transformMatrix[1][2]
+
+        # astype() truncates toward zero, like int()
+        iXSrc = fXSrc.astype(numpy.int64)
+        iYSrc = fYSrc.astype(numpy.int64)
+
+        if configSamplingRange is None:
+            # no sampling, only based on current pixel value
+            inside = (iXSrc >= 0) & (iYSrc >= 0) & (iXSrc < configWidth) & (iYSrc < configHeight)
+            if occupancy is not None:
+                inside[inside] = HalftoneSampler.occupiedCells(occupancy, iXSrc[inside], iYSrc[inside], 1, configWidth, configHeight)
+            fXSrc = fXSrc[inside]
+            fYSrc = fYSrc[inside]
+            iXSrc = iXSrc[inside]
+            iYSrc = iYSrc[inside]
+
+            if desaturate is None:
+                value = imgValue[iYSrc, iXSrc].astype(valuesType)
+            else:
+                # only pixels at dots positions are desaturated
+                value = HalftoneSeparation.gray(imgSrcArray[iYSrc, iXSrc], desaturate).astype(valuesType)
+            alpha = imgAlpha[iYSrc, iXSrc].astype(valuesType)
+
+            fRadius = numpy.where(alpha == 0xFF,
+                                  (255 - value) / 255,
+                                  (65025 + (value - 255) * alpha) / 65025)
+
+            # completely transparent pixels are ignored
+            drawn = (alpha > 0)
+            return (fXSrc[drawn], fYSrc[drawn], fRadius[drawn])
+
+        inside = ((iXSrc <= configWidth) & (iYSrc <= configHeight) & (iXSrc >= -dotiSize) & (iYSrc >= -dotiSize))
+        if occupancy is not None:
+            inside[inside] = HalftoneSampler.occupiedCells(occupancy, iXSrc[inside], iYSrc[inside], dotiSize, configWidth, configHeight)
+        fXSrc = fXSrc[inside]
+        fYSrc = fYSrc[inside]
+        iXSrc = iXSrc[inside]
+        iYSrc = iYSrc[inside]
+
+        # alpha weighted value of pixels
+        #   255 - int((255 - value) * alpha/255)
+        # int() of a positive value is a floor, then an integer division
+        # provides exactly the same result
+        if valuesType == numpy.float64:
+            weighted = 255 - ((255 - imgValue) * imgAlpha) / 255
+        else:
+            weighted = 255 - ((255 - imgValue.astype(numpy.int32)) * imgAlpha) // 255
+        # fully transparent pixels are not taken in account
+        weightedCount = (imgAlpha > 0)
+        weighted[~weightedCount] = 0
+
+        if sampling == HalftoneSampler.SAMPLING_HIGH:
+            # average of all pixels in cell: 4 lookups in summed area tables
+            sumPx = HalftoneSampler.cellsSum(HalftoneSampler.summedAreaTable(weighted), iXSrc, iYSrc, dotiSize)
+            nbPx = HalftoneSampler.cellsSum(HalftoneSampler.summedAreaTable(weightedCount), iXSrc, iYSrc, dotiSize)
+        else:
+            # average of one pixel on two in cell
+            # sampled pixels of a cell have same parity than cell origin: build
+            # summed area tables for each parity and use table matching cell origin
+            sumPx = numpy.zeros(fXSrc.shape, dtype=valuesType)
+            nbPx = numpy.zeros(fXSrc.shape, dtype=numpy.int64)
+            # number of sampled pixels on each axis
+            dotiSizeSampled = len(configSamplingRange)
+
+            for parityY in (0, 1):
+                for parityX in (0, 1):
+                    cells = ((iXSrc & 1) == parityX) & ((iYSrc & 1) == parityY)
+                    if not cells.any():
+                        continue
+
+                    # (iSrc - parity) is even, then '>> 1' is an exact division
+                    iXSampled = (iXSrc[cells] - parityX) >> 1
+                    iYSampled = (iYSrc[cells] - parityY) >> 1
+
+                    sumPx[cells] = HalftoneSampler.cellsSum(HalftoneSampler.summedAreaTable(weighted[parityY::2, parityX::2]),
+                                                            iXSampled, iYSampled, dotiSizeSampled)
+                    nbPx[cells] = HalftoneSampler.cellsSum(HalftoneSampler.summedAreaTable(weightedCount[parityY::2, parityX::2]),
+                                                           iXSampled, iYSampled, dotiSizeSampled)
+
+        drawn = (nbPx > 0)
+        fRadius = (255 - sumPx[drawn] / nbPx[drawn]) / 255
+
+        return (fXSrc[drawn], fYSrc[drawn], fRadius)
+
+
+class HalftoneSeparation:
+    """Layers operations used to separate colors, made in memory on pixels
+    arrays instead of Krita layers (NumPy only)
+
+    Pixels arrays are (height, width, 4) uint8 arrays of BGRA values, as
+    provided by pixelData() for RGBA/U8 layers
+
+    Calculations reproduce Krita 8bits integer arithmetic (KoColorSpaceMaths)
+    and composite ops formulas, then results are the same than the ones
+    obtained with layers
+
+    Ink planes of CMYKA/U8 pixels data (see inkPixelData()) are extracted,
+    and pixels data masked by a selection (see maskPixelData()), without NumPy
+    if not available
+    """
+
+    # blending modes for which composition can be made
+    BLENDING_MODES = ('add', 'converse', 'divide', 'multiply')
+
+    # desaturate filter types
+    DESATURATE_LIGHTNESS = 0
+    DESATURATE_LUMINOSITY709 = 1
+    DESATURATE_LUMINOSITY601 = 2
+    DESATURATE_AVERAGE = 3
+    DESATURATE_MINIMUM = 4
+    DESATURATE_MAXIMUM = 5
+
+    # CMYKA/U8 pixels data: position of ink channels in a 5 bytes pixel
+    INK_CHANNELS = {'C': 0, 'M': 1, 'Y': 2, 'K': 3}
+    INK_ALPHA = 4
+
+    # ink amount (0: no ink) to gray value (255: white)
+    INK_TO_GRAY = bytes(range(255, -1, -1))
+
+    # 8bits values / 255, as single precision floats (see grayFunction())
+    FLOAT32_VALUES = [unpack('f', pack('f', value / 255))[0] for value in range(256)]
+
+    @staticmethod
+    def inkPixelData(data, color):
+        """Return RGBA/U8 pixels data (a QByteArray) of gray values for ink
+        amount of given `color` ('C', 'M', 'Y' or 'K') from CMYKA/U8 pixels data
+        """
+        data = bytes(data)
+        gray = data[HalftoneSeparation.INK_CHANNELS[color]::5].translate(HalftoneSeparation.INK_TO_GRAY)
+
+        returned = bytearray(len(data) // 5 * 4)
+        returned[0::4] = gray
+        returned[1::4] = gray
+        returned[2::4] = gray
+        returned[3::4] = data[HalftoneSeparation.INK_ALPHA::5]
+        return QByteArray(bytes(returned))
+
+    @staticmethod
+    def maskPixelData(data, selectionData):
+        """Return RGBA/U8 pixels data (a QByteArray) for which alpha channel is
+        multiplied by given selection pixels data (one byte per pixel)
+        """
+        if NUMPY_AVAILABLE:
+            pixels = numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, 4).copy()
+            mask = numpy.frombuffer(selectionData, dtype=numpy.uint8).astype(numpy.int32)
+            pixels[:, 3] = HalftoneSeparation.mul(pixels[:, 3].astype(numpy.int32), mask)
+            return QByteArray(pixels.tobytes())
+
+        returned = bytearray(data)
+        mask = bytes(selectionData)
+        for index in range(len(mask)):
+            if mask[index] < 255:
+                alpha = returned[index * 4 + 3] * mask[index] + 0x80
+                returned[index * 4 + 3] = ((alpha >> 8) + alpha) >> 8
+        return QByteArray(bytes(returned))
+
+    @staticmethod
+    def fromPixelData(data, width, height):
+        """Return given RGBA/U8 pixels data (a QByteArray) as a pixels array"""
+        return numpy.frombuffer(data, dtype=numpy.uint8).reshape(height, width, 4)
+
+    @staticmethod
+    def toPixelData(pixels):
+        """Return RGBA/U8 pixels data (a QByteArray) for given pixels array"""
+        return QByteArray(numpy.ascontiguousarray(pixels).tobytes())
+
+    @staticmethod
+    def mul(a, b):
+        """Return a*b/255, for int32 arrays of 8bits values"""
+        t = a * b + 0x80
+        return ((t >> 8) + t) >> 8
+
+    @staticmethod
+    def mul3(a, b, c):
+        """Return a*b*c/65025, for int32 arrays of 8bits values"""
+        t = a * b * c + 0x7F5B
+        return ((t >> 7) + t) >> 16
+
+    @staticmethod
+    def div(a, b):
+        """Return a*255/b, for int32 arrays of 8bits values (b > 0)"""
+        return (a * 255 + (b >> 1)) // b
+
+    @staticmethod
+    def blend(blendingMode, src, dst):
+        """Return result of blending function for given int32 arrays"""
+        if blendingMode == 'add':
+            return numpy.minimum(src + dst, 255)
+        elif blendingMode == 'converse':
+            return (255 - src) | dst
+        elif blendingMode == 'divide':
+            return numpy.where(src == 0,
+                               numpy.where(dst == 0, 0, 255),
+                               numpy.minimum(HalftoneSeparation.div(dst, numpy.maximum(src, 1)), 255))
+        elif blendingMode == 'normal':
+            return src
+        else:
+            # multiply
+            return HalftoneSeparation.mul(src, dst)
+
+    @staticmethod
+    def color(color):
+        """Return a (1, 1, 4) pixels array for given opaque QColor, that can be
+        used (broadcasted) instead of a pixels array filled with color"""
+        return numpy.array([[[color.blue(), color.green(), color.red(), 255]]], dtype=numpy.uint8)
+
+    @staticmethod
+    def fill(width, height, color):
+        """Return an opaque pixels array filled with given QColor"""
+        returned = numpy.empty((height, width, 4), dtype=numpy.uint8)
+        returned[:, :] = (color.blue(), color.green(), color.red(), 255)
+        return returned
+
+    @staticmethod
+    def transparent(width, height):
+        """Return a transparent pixels array"""
+        return numpy.zeros((height, width, 4), dtype=numpy.uint8)
+
+    @staticmethod
+    def compose(dst, src, blendingMode, opacity):
+        """Return result of `src` pixels composed over `dst` pixels, with given
+        blending mode and opacity (in range [0, 255])
+
+        Same than merging down a layer `src` on a layer `dst`; arrays can be
+        broadcasted (see color())
+
+        The 'normal' blending mode is accepted to compose final layers of a
+        preview, but values can differ from Krita ones by one unit (it's not
+        in BLENDING_MODES)
+        """
+        mul = HalftoneSeparation.mul
+        mul3 = HalftoneSeparation.mul3
+
+        srcAlpha = mul3(src[:, :, 3:].astype(numpy.int32), 255, opacity)
+        dstAlpha = dst[:, :, 3:].astype(numpy.int32)
+        newAlpha = srcAlpha + dstAlpha - mul(srcAlpha, dstAlpha)
+
+        srcValue = src[:, :, :3].astype(numpy.int32)
+        # color of a fully transparent pixel is undefined
+        dstValue = numpy.where(dstAlpha > 0, dst[:, :, :3], 0).astype(numpy.int32)
+
+        value = (mul3(255 - srcAlpha, dstAlpha, dstValue) +
+                 mul3(srcAlpha, 255 - dstAlpha, srcValue) +
+                 mul3(srcAlpha, dstAlpha, HalftoneSeparation.blend(blendingMode, srcValue, dstValue)))
+
+        returned = numpy.empty(numpy.broadcast(src, dst).shape, dtype=numpy.uint8)
+        # values are stored on 8bits
+        returned[:, :, :3] = numpy.where(newAlpha > 0, HalftoneSeparation.div(value & 0xFF, numpy.maximum(newAlpha, 1)), 0)
+        returned[:, :, 3:] = newAlpha
+        return returned
+
+    @staticmethod
+    def blur(pixels, radius):
+        """Return given pixels blurred by a gaussian kernel of given radius
+
+        Approximation of Krita gaussian blur filter, used for previews: kernel
+        is defined the same way (sigma = 0.3 * radius + 0.3) but values are
+        calculated with floats; pixels outside array are transparent
+        """
+        sigma = 0.3 * radius + 0.3
+        half = 3 * ceil(sigma)
+        kernel = numpy.exp(-numpy.arange(-half, half + 1, dtype=numpy.float32) ** 2 / (2 * sigma * sigma))
+        kernel /= kernel.sum()
+
+        height, width = pixels.shape[:2]
+
+        # blurred on premultiplied values
+        values = pixels.astype(numpy.float32)
+        values[:, :, :3] *= values[:, :, 3:] / 255
+
+        padded = numpy.pad(values, ((half, half), (0, 0), (0, 0)))
+        values = sum([kernel[index] * padded[index:index + height] for index in range(len(kernel))])
+        padded = numpy.pad(values, ((0, 0), (half, half), (0, 0)))
+        values = sum([kernel[index] * padded[:, index:index + width] for index in range(len(kernel))])
+
+        returned = numpy.empty(pixels.shape, dtype=numpy.uint8)
+        alpha = values[:, :, 3:]
+        returned[:, :, :3] = numpy.clip(numpy.where(alpha > 0, values[:, :, :3] * 255 / numpy.maximum(alpha, 1e-6), 0) + 0.5, 0, 255)
+        returned[:, :, 3:] = numpy.clip(alpha + 0.5, 0, 255)
+        return returned
+
+    @staticmethod
+    def gray(pixels, desaturateType):
+        """Return gray values of given BGRA pixels (last axis of array), like
+        desaturate filter
+
+        Values of uint8 pixels are rounded like filter ones; float pixels (in
+        range [0.0, 255.0]) provide float values, without rounding
+        """
+        if pixels.dtype.kind == 'f':
+            values = pixels[..., :3] / 255
+        else:
+            # values are converted to float, like in filter
+            values = pixels[..., :3].astype(numpy.float32) / numpy.float32(255)
+        blue = values[..., 0]
+        green = values[..., 1]
+        red = values[..., 2]
+
+        if desaturateType == HalftoneSeparation.DESATURATE_LIGHTNESS:
+            gray = (numpy.maximum(numpy.maximum(red, green), blue) + numpy.minimum(numpy.minimum(red, green), blue)) / numpy.float32(2)
+        elif desaturateType == HalftoneSeparation.DESATURATE_LUMINOSITY709:
+            # coefficients are double values
+            gray = numpy.dot(values.astype(numpy.float64), (0.0722, 0.7152, 0.2126)).astype(numpy.float32)
+        elif desaturateType == HalftoneSeparation.DESATURATE_LUMINOSITY601:
+            gray = numpy.dot(values.astype(numpy.float64), (0.114, 0.587, 0.299)).astype(numpy.float32)
+        elif desaturateType == HalftoneSeparation.DESATURATE_AVERAGE:
+            gray = (red + green + blue) / numpy.float32(3)
+        elif desaturateType == HalftoneSeparation.DESATURATE_MINIMUM:
+            gray = numpy.minimum(numpy.minimum(red, green), blue)
+        else:
+            gray = numpy.maximum(numpy.maximum(red, green), blue)
+
+        if pixels.dtype.kind == 'f':
+            return gray * 255
+        return numpy.floor(numpy.clip(gray * numpy.float32(255), 0, 255) + 0.5).astype(numpy.uint8)
+
+    @staticmethod
+    def float32(value):
+        """Return given float value rounded to single precision"""
+        return unpack('f', pack('f', value))[0]
+
+    @staticmethod
+    def grayFunction(desaturateType):
+        """Return a function f(blue, green, red) that return gray value of a
+        pixel, like desaturate filter (pure python)
+
+        Single precision float operations of gray() are emulated, then values
+        are the same than gray() ones
+        """
+        f32 = HalftoneSeparation.float32
+        # value / 255, as float32
+        values = HalftoneSeparation.FLOAT32_VALUES
+
+        def gray(value):
+            return int(f32(min(max(f32(value * 255), 0), 255) + 0.5))
+
+        if desaturateType == HalftoneSeparation.DESATURATE_LIGHTNESS:
+            return lambda blue, green, red: gray(f32((values[max(red, green, blue)] + values[min(red, green, blue)]) / 2))
+        elif desaturateType == HalftoneSeparation.DESATURATE_LUMINOSITY709:
+            return lambda blue, green, red: gray(f32(values[blue] * 0.0722 + values[green] * 0.7152 + values[red] * 0.2126))
+        elif desaturateType == HalftoneSeparation.DESATURATE_LUMINOSITY601:
+            return lambda blue, green, red: gray(f32(values[blue] * 0.114 + values[green] * 0.587 + values[red] * 0.299))
+        elif desaturateType == HalftoneSeparation.DESATURATE_AVERAGE:
+            return lambda blue, green, red: gray(f32(f32(f32(values[red] + values[green]) + values[blue]) / 3))
+        elif desaturateType == HalftoneSeparation.DESATURATE_MINIMUM:
+            return lambda blue, green, red: min(red, green, blue)
+        return lambda blue, green, red: max(red, green, blue)
+
+    @staticmethod
+    def desaturate(pixels, desaturateType):
+        """Return gray pixels for given pixels, like desaturate filter"""
+        returned = numpy.empty(pixels.shape, dtype=numpy.uint8)
+        returned[:, :, :3] = HalftoneSeparation.gray(pixels, desaturateType)[:, :, None]
+        returned[:, :, 3] = pixels[:, :, 3]
+        return returned
+
+    @staticmethod
+    def bounds(pixels):
+        """Return bounds (x, y, width, height) of non transparent pixels, or
+        None if all pixels are transparent"""
+        visible = numpy.any(pixels != 0, axis=2)
+        rows = numpy.flatnonzero(visible.any(axis=1))
+        if len(rows) == 0:
+            return None
+        columns = numpy.flatnonzero(visible.any(axis=0))
+        return (int(columns[0]), int(rows[0]), int(columns[-1] - columns[0] + 1), int(rows[-1] - rows[0] + 1))
+
+
+class HalftoneSeparationPlan:
+    """Execution plan of layers processes of an output mode, for an in memory
+    separation (NumPy only)
+
+    Layers processes (list of {'color', 'process'} dictionaries, see output
+    modes definitions) are compiled into a directed acyclic graph of pixels
+    operations, in which each operation is identified by a key:
+    - ('original',): pixels of original layer
+    - ('ink', color): ink amount of a color, from conversion of original layer
+      to CMYK
+    - ('layer', color): pixels of a color layer on which halftone is applied
+    - ('fill', rgba): opaque color
+    - ('compose', dstKey, srcKey, blendingMode, opacity): merge down
+    - ('desaturate', srcKey, desaturateType): desaturate filter
+
+    Identical operations have the same key, and then are calculated once
+    (duplicated @original layers are read once, layers referenced by others
+    colors are built once)
+    Operations used only once are fused: they're calculated by bands of rows,
+    without intermediate arrays of image size
+    Calculated pixels are kept only until the last step that uses them (see
+    stepDone())
+
+    The 'original', 'ink' and 'layer' keys are inputs, for which pixels are
+    provided by caller: if they're read before (see inputKeys()), pixels can
+    be calculated outside main thread
+    """
+
+    # number of rows of bands for fused operations
+    BAND_HEIGHT = 64
+
+    INPUTS = ('original', 'ink', 'layer')
+
+    def __init__(self, layers, originalProperties):
+        """Compile given layers processes
+
+        Given `originalProperties` is a tuple (blendingMode, opacity) of
+        original layer
+        """
+        self.__steps = []
+        self.__isValid = True
+        # key = operation key, value = number of operations/steps using it
+        self.__uses = {}
+        # key = operation key, value = pixels array
+        self.__cache = {}
+        # key = operation key, value = index of last step using it
+        self.__lastUse = {}
+
+        self.__compile(layers, originalProperties)
+
+        if self.__isValid:
+            for index, step in enumerate(self.__steps):
+                if 'source' in step:
+                    self.__countUses(step['source'])
+                    self.__setLastUse(step['source'], index)
+
+    def __compile(self, layers, originalProperties):
+        """Build execution steps from layers processes"""
+        # layers removed by a next process are never created
+        removedColors = [layer['color'] for layer in layers
+                         if 'remove' in [process['action'] for process in layer['process']]]
+
+        # current item of colors layers: [key, blendingMode, opacity]
+        # key = color, value = item
+        colors = {}
+        # colors for which a layer is created
+        createdColors = []
+
+        for layer in layers:
+            color = layer['color']
+            # layers stack, last item is current processed layer
+            stack = []
+            if color in colors:
+                stack.append(colors[color])
+
+            for process in layer['process']:
+                action = process['action']
+                value = process['value']
+
+                if action == 'duplicate' and value == '@original':
+                    stack.append([('original',), originalProperties[0], originalProperties[1]])
+                elif action == 'duplicate' and value[1:] in colors:
+                    stack.append(list(colors[value[1:]]))
+                elif action == 'new' and value['type'] == 'filllayer':
+                    stack.append([('fill', value['color'].rgba()), 'normal', 255])
+                elif action == 'separate':
+                    stack.append([('ink', value), 'normal', 255])
+                elif action == 'blending mode':
+                    stack[-1][1] = value
+                elif action == 'opacity':
+                    stack[-1][2] = value
+                elif action == 'merge down' and stack[-1][1] in HalftoneSeparation.BLENDING_MODES:
+                    srcItem = stack.pop()
+                    stack[-1] = [('compose', stack[-1][0], srcItem[0], srcItem[1], srcItem[2]), stack[-1][1], stack[-1][2]]
+                elif action == 'filter' and re.match("name=desaturate;type=[0-5]$", value):
+                    stack[-1][0] = ('desaturate', stack[-1][0], int(value[-1]))
+                elif action == 'newspaper':
+                    self.__steps.append({'action': 'newspaper',
+                                         'color': color,
+                                         'value': value,
+                                         'source': stack[-1][0],
+                                         'desaturate': process.get('desaturate')})
+                    stack[-1][0] = ('layer', color)
+                    createdColors.append(color)
+                elif action == 'remove':
+                    stack.pop()
+                    colors.pop(color)
+                    if color in createdColors:
+                        self.__steps.append({'action': 'remove', 'color': color})
+                else:
+                    # can't be made in memory
+                    self.__isValid = False
+                    return
+
+            if len(stack) > 0:
+                colors[color] = stack[-1]
+
+                if stack[-1][0] != ('layer', color) and color not in removedColors:
+                    self.__steps.append({'action': 'create',
+                                         'color': color,
+                                         'source': stack[-1][0]})
+                    createdColors.append(color)
+
+                if color in createdColors:
+                    self.__steps.append({'action': 'properties',
+                                         'color': color,
+                                         'blendingMode': stack[-1][1],
+                                         'opacity': stack[-1][2]})
+
+    def __countUses(self, key):
+        """Count uses of given operation and, the first time, of operations it uses"""
+        self.__uses[key] = self.__uses.get(key, 0) + 1
+        if self.__uses[key] == 1:
+            if key[0] == 'compose':
+                self.__countUses(key[1])
+                self.__countUses(key[2])
+            elif key[0] == 'desaturate':
+                self.__countUses(key[1])
+
+    def __setLastUse(self, key, index):
+        """Set given step index as last step using operation and operations it uses"""
+        self.__lastUse[key] = index
+        if key[0] == 'compose':
+            self.__setLastUse(key[1], index)
+            self.__setLastUse(key[2], index)
+        elif key[0] == 'desaturate':
+            self.__setLastUse(key[1], index)
+
+    def __band(self, key, top, height, width, imageHeight, inputs):
+        """Return pixels of given operation for rows `top` to `top + height`"""
+        if key[0] in HalftoneSeparationPlan.INPUTS or self.__uses.get(key, 0) > 1:
+            # calculated once for whole image
+            return self.pixels(key, width, imageHeight, inputs)[top:top + height]
+        return self.__operationBand(key, top, height, width, imageHeight, inputs)
+
+    def __operationBand(self, key, top, height, width, imageHeight, inputs):
+        """Calculate pixels of given operation for rows `top` to `top + height`"""
+        if key[0] == 'fill':
+            return HalftoneSeparation.color(QColor.fromRgba(key[1]))
+        elif key[0] == 'compose':
+            return HalftoneSeparation.compose(self.__band(key[1], top, height, width, imageHeight, inputs),
+                                              self.__band(key[2], top, height, width, imageHeight, inputs),
+                                              key[3],
+                                              key[4])
+        else:
+            return HalftoneSeparation.desaturate(self.__band(key[1], top, height, width, imageHeight, inputs), key[2])
+
+    def isValid(self):
+        """Return True if all layers processes can be made in memory"""
+        return self.__isValid
+
+    def steps(self):
+        """Return execution steps, list of dictionaries:
+        - {'action': 'newspaper', 'color', 'value', 'source', 'desaturate'}:
+          create layer for color, and apply halftone from `source` pixels
+        - {'action': 'create', 'color', 'source'}: create layer for color with
+          `source` pixels
+        - {'action': 'properties', 'color', 'blendingMode', 'opacity'}: set
+          properties of color layer
+        - {'action': 'remove', 'color'}: remove color layer
+
+        Layers are created in steps order, each one on top of previous ones
+        """
+        return self.__steps
+
+    def inputKeys(self, key):
+        """Return list of input keys for which pixels are needed to calculate
+        pixels of given operation key (inputs already kept are ignored)"""
+        if key in self.__cache:
+            return []
+        elif key[0] in HalftoneSeparationPlan.INPUTS:
+            return [key]
+        elif key[0] == 'compose':
+            returned = self.inputKeys(key[1])
+            return returned + [inputKey for inputKey in self.inputKeys(key[2]) if inputKey not in returned]
+        elif key[0] == 'desaturate':
+            return self.inputKeys(key[1])
+        return []
+
+    def pixels(self, key, width, height, inputs):
+        """Return pixels array of image size (`width`, `height`) for given
+        operation key
+
+        Given `inputs` is a function inputs(key) that return pixels array of
+        an input key
+        """
+        if key in self.__cache:
+            return self.__cache[key]
+
+        if key[0] in HalftoneSeparationPlan.INPUTS:
+            returned = inputs(key)
+        else:
+            returned = numpy.empty((height, width, 4), dtype=numpy.uint8)
+            for top in range(0, height, HalftoneSeparationPlan.BAND_HEIGHT):
+                bandHeight = min(HalftoneSeparationPlan.BAND_HEIGHT, height - top)
+                returned[top:top + bandHeight] = self.__operationBand(key, top, bandHeight, width, height, inputs)
+
+        if key[0] in HalftoneSeparationPlan.INPUTS or self.__uses.get(key, 0) > 1:
+            # used more than once
+            self.__cache[key] = returned
+        return returned
+
+    def stepDone(self, index):
+        """Release calculated pixels that are not used by steps after given
+        step index"""
+        for key in [key for key in self.__cache if self.__lastUse.get(key, -1) <= index]:
+            self.__cache.pop(key)
+
+    def clear(self):
+        """Release calculated pixels"""
+        self.__cache = {}
+
+
+class HalftoneJitter:
+    """Reproducible random values for dots
+
+    Values are not taken from a random generator sequence but calculated from
+    a hash of dot position and a seed: a dot always get the same value for a
+    given seed, whatever the number of dots or the order in which they are
+    processed
+    """
+
+    MASK = 0xFFFFFFFFFFFFFFFF
+
+    # dot positions are quantized to 1/POSITION_SCALE pixel
+    POSITION_SCALE = 64
+
+    # multipliers (splitmix64)
+    GOLDEN = 0x9E3779B97F4A7C15
+    MIX1 = 0xBF58476D1CE4E5B9
+    MIX2 = 0x94D049BB133111EB
+
+    @staticmethod
+    def __mixPython(value):
+        """Return hash of given 64bits integer"""
+        value = ((value ^ (value >> 30)) * HalftoneJitter.MIX1) & HalftoneJitter.MASK
+        value = ((value ^ (value >> 27)) * HalftoneJitter.MIX2) & HalftoneJitter.MASK
+        return value ^ (value >> 31)
+
+    @staticmethod
+    def __mixNumPy(values):
+        """Return hash of given array of uint64 (operations wrap on 64bits)"""
+        values = (values ^ (values >> numpy.uint64(30))) * numpy.uint64(HalftoneJitter.MIX1)
+        values = (values ^ (values >> numpy.uint64(27))) * numpy.uint64(HalftoneJitter.MIX2)
+        return values ^ (values >> numpy.uint64(31))
+
+    @staticmethod
+    def values(dotsX, dotsY, seed, stream):
+        """Return values in range [0.0, 1.0[ for given dots
+
+        Different `stream` values provide independent values for same dots
+
+        If `dotsX` and `dotsY` are numpy arrays, a numpy array is returned,
+        otherwise a list; values are the same in both cases
+        """
+        key = ((seed * 2 + 1) * HalftoneJitter.GOLDEN + stream) & HalftoneJitter.MASK
+
+        if isinstance(dotsX, list):
+            mix = HalftoneJitter.__mixPython
+            returned = []
+            for fXSrc, fYSrc in zip(dotsX, dotsY):
+                value = mix(key ^ (round(fXSrc * HalftoneJitter.POSITION_SCALE) & HalftoneJitter.MASK))
+                value = mix(value ^ (round(fYSrc * HalftoneJitter.POSITION_SCALE) & HalftoneJitter.MASK))
+                # 53 bits: float mantissa
+                returned.append((value >> 11) / 9007199254740992)
+            return returned
+
+        mix = HalftoneJitter.__mixNumPy
+        # like round(), rint() rounds half to even; signed integers are
+        # converted as 64bits two's complement
+        keysX = numpy.rint(dotsX * HalftoneJitter.POSITION_SCALE).astype(numpy.int64).view(numpy.uint64)
+        keysY = numpy.rint(dotsY * HalftoneJitter.POSITION_SCALE).astype(numpy.int64).view(numpy.uint64)
+
+        values = mix(numpy.uint64(key) ^ keysX)
+        values = mix(values ^ keysY)
+        return (values >> numpy.uint64(11)).astype(numpy.float64) / 9007199254740992
+
+
+class HalftoneSpriteAtlas:
+    """Pre-rendered dots (sprites) for a dot style
+
+    Once radius and dot center sub-pixel position are quantized, a dot style
+    (circle, diamond) provides a finite set of dots: each dot is
+    rendered once as a sprite, and then stamped on canvas
+
+    Sprites are rendered on demand, and atlases are cached to be reused by
+    next renders made with the same dot style
+    """
+
+    # number of quantized radius values
+    LEVELS = 255
+    # number of quantized sub-pixel positions, for each axis
+    PHASES = 4
+    # maximum sprite width/height, in pixels; bigger dots are not rendered with sprites
+    MAX_SIZE = 33
+    # maximum number of atlases kept in cache
+    CACHE_SIZE = 4
+
+    __cache = {}
+    __cacheLock = Lock()
+
+    @staticmethod
+    def atlas(drawMode, radiusScale, antialiasing, pen, brush):
+        """Return atlas for given dot style
+
+        Given `radiusScale` is the radius of a dot with a coverage of 1.0
+        Return None if dots are too big to be rendered with sprites
+        """
+        margin = ceil(radiusScale) + 2
+        if 2 * margin + 1 > HalftoneSpriteAtlas.MAX_SIZE:
+            return None
+
+        key = (drawMode, radiusScale, antialiasing,
+               pen.style(), pen.color().rgba(), pen.widthF(),
+               brush.style(), brush.color().rgba())
+
+        with HalftoneSpriteAtlas.__cacheLock:
+            returned = HalftoneSpriteAtlas.__cache.pop(key, None)
+            if returned is None:
+                returned = HalftoneSpriteAtlas(radiusScale, margin)
+                if len(HalftoneSpriteAtlas.__cache) >= HalftoneSpriteAtlas.CACHE_SIZE:
+                    # remove least recently used atlas
+                    HalftoneSpriteAtlas.__cache.pop(next(iter(HalftoneSpriteAtlas.__cache)))
+            # last item in cache is the most recently used atlas
+            HalftoneSpriteAtlas.__cache[key] = returned
+
+        return returned
+
+    def __init__(self, radiusScale, margin):
+        self.__radiusScale = radiusScale
+        # distance between sprite border and quantized dot center
+        self.__margin = margin
+        self.__size = 2 * margin + 1
+        # key = (level, phaseX, phaseY)
+        self.__sprites = {}
+
+    def __sprite(self, key, paintDot):
+        """Render, cache and return sprite for given key"""
+        level, phaseX, phaseY = key
+        radius = level * self.__radiusScale / HalftoneSpriteAtlas.LEVELS
+
+        returned = QImage(self.__size, self.__size, QImage.Format_ARGB32_Premultiplied)
+        returned.fill(Qt.transparent)
+
+        canvas = QPainter()
+        canvas.begin(returned)
+        paintDot(canvas,
+                 self.__margin + phaseX / HalftoneSpriteAtlas.PHASES,
+                 self.__margin + phaseY / HalftoneSpriteAtlas.PHASES,
+                 radius)
+        canvas.end()
+
+        # when used from many threads, a sprite can be rendered more than once;
+        # it doesn't matter, rendered sprites are the same
+        self.__sprites[key] = returned
+        return returned
+
+    def paint(self, canvas, dotsX, dotsY, radius, paintDot):
+        """Stamp given dots on given `canvas` (an active QPainter)
+
+        Missing sprites are rendered with given `paintDot` function, called
+        with parameters (canvas, x, y, radius)
+        """
+        phases = HalftoneSpriteAtlas.PHASES
+        levelFactor = HalftoneSpriteAtlas.LEVELS / self.__radiusScale
+        margin = self.__margin
+        sprites = self.__sprites
+        drawImage = canvas.drawImage
+
+        for fXSrc, fYSrc, fRadius in zip(dotsX, dotsY, radius):
+            level = round(fRadius * levelFactor)
+            if level == 0:
+                # nothing to paint
+                continue
+
+            iXSrc = round(fXSrc * phases)
+            iYSrc = round(fYSrc * phases)
+            key = (level, iXSrc % phases, iYSrc % phases)
+
+            sprite = sprites.get(key)
+            if sprite is None:
+                sprite = self.__sprite(key, paintDot)
+
+            drawImage(iXSrc // phases - margin, iYSrc // phases - margin, sprite)
+
+
+class HalftoneRenderer:
+    """Paint dots returned by HalftoneSampler
+
+    Dots are painted by batches, to reduce number of calls to Qt
+    Rendering can be made on a single painter, or split in horizontal strips
+    painted in parallel by worker threads (QPainter on a QImage can be used
+    outside GUI thread)
+    """
+
+    DRAW_MODE_CIRCLE = 0
+    DRAW_MODE_DIAMOND = 1
+    DRAW_MODE_SQUARE = 2
+    DRAW_MODE_LINEFLAT = 3
+    DRAW_MODE_LINEROUND = 4
+
+    # minimum height for a strip, avoid to manage too many small strips
+    STRIP_MIN_HEIGHT = 64
+
+    # number of dots painted in one batch
+    BATCH_SIZE = 4096
+
+    @staticmethod
+    def idealThreadCount(threads=0):
+        """Return number of worker threads to use
+
+        If given `threads` is 0 or lower, return number of threads according to
+        number of processor cores
+        """
+        if threads > 0:
+            return threads
+        return max(1, QThread.idealThreadCount())
+
+    def __init__(self, drawMode, brush, pen, antialiasing, dotSize, dotFullSizeFactor, rotation, rotationD):
+        self.__drawMode = drawMode
+        self.__brush = QBrush(brush)
+        self.__pen = QPen(pen)
+        self.__antialiasing = antialiasing
+        self.__dotSize = dotSize
+        self.__dotHSize = dotSize / 2
+        self.__dotFullSizeFactor = dotFullSizeFactor
+        self.__rotation = rotation
+        self.__rotationD = rotationD
+
+    def radius(self, coverage, steadiness, dotsX, dotsY, seed=0):
+        """Return dots radius (radiusX, radiusY) from given dots coverage
+
+        If `steadiness` is lower than 10, a random variation is applied to radius;
+        variation of a dot is defined by its position (`dotsX`, `dotsY`) and
+        given `seed` (see HalftoneJitter)
+        """
+        if isinstance(coverage, list):
+            if self.__dotFullSizeFactor != 1:
+                radius = [fRadius * self.__dotFullSizeFactor for fRadius in coverage]
+            else:
+                radius = [fRadius * self.__dotSize for fRadius in coverage]
+
+            if steadiness < 10:
+                variationsX = HalftoneJitter.values(dotsX, dotsY, seed, 0)
+                variationsY = HalftoneJitter.values(dotsX, dotsY, seed, 1)
+                return ([fRadius * (1 + ((fVariation - 0.5) / steadiness)) for fRadius, fVariation in zip(radius, variationsX)],
+                        [fRadius * (1 + ((fVariation - 0.5) / steadiness)) for fRadius, fVariation in zip(radius, variationsY)])
+            return (radius, radius)
+
+        # numpy arrays
+        if self.__dotFullSizeFactor != 1:
+            radius = coverage * self.__dotFullSizeFactor
+        else:
+            radius = coverage * self.__dotSize
+
+        if steadiness < 10:
+            return (radius * (1 + ((HalftoneJitter.values(dotsX, dotsY, seed, 0) - 0.5) / steadiness)),
+                    radius * (1 + ((HalftoneJitter.values(dotsX, dotsY, seed, 1) - 0.5) / steadiness)))
+        return (radius, radius)
+
+    def margin(self, radiusX, radiusY):
+        """Return maximum distance, in pixels, between a dot center and a pixel painted for dot"""
+        if len(radiusX) == 0:
+            return 0
+
+        if isinstance(radiusX, list):
+            maxRadius = max(max(radiusX), max(radiusY))
+        else:
+            maxRadius = max(radiusX.max(), radiusY.max())
+        if self.__drawMode in (HalftoneRenderer.DRAW_MODE_LINEFLAT, HalftoneRenderer.DRAW_MODE_LINEROUND):
+            # line from (-0.5, dotHSize) to (dotSize+0.5, dotHSize), rotated around dot center
+            # and with a pen width equal to radius
+            return ceil(sqrt((self.__dotSize + 0.5)**2 + self.__dotHSize**2) + maxRadius / 2) + 2
+        # +2: antialiasing and rounding
+        return ceil(maxRadius) + 2
+
+    def paint(self, canvas, dotsX, dotsY, radiusX, radiusY, progressCallback=None):
+        """Paint given dots on given `canvas` (an active QPainter)
+
+        Dots are painted by batches of BATCH_SIZE dots; when possible, all dots
+        of a batch are painted with one call
+
+        If provided, `progressCallback` is called after each batch with the
+        ratio of work done (0.0 to 1.0)
+        """
+        canvas.setPen(QPen(self.__pen))
+        canvas.setBrush(QBrush(self.__brush))
+        canvas.setRenderHint(QPainter.Antialiasing, self.__antialiasing)
+
+        if isinstance(dotsX, list):
+            dotsList = (dotsX, dotsY, radiusX, radiusY)
+        else:
+            # iterate over python lists is faster than iterate over numpy arrays
+            dotsList = (dotsX.tolist(), dotsY.tolist(), radiusX.tolist(), radiusY.tolist())
+
+        atlas = None
+        if self.__drawMode in (HalftoneRenderer.DRAW_MODE_CIRCLE, HalftoneRenderer.DRAW_MODE_DIAMOND) and dotsList[2] == dotsList[3]:
+            # no steadiness variation, dots can be stamped from pre-rendered sprites
+            # (not used for squares: painting all squares of a batch with one call is faster)
+            if self.__dotFullSizeFactor != 1:
+                atlas = HalftoneSpriteAtlas.atlas(self.__drawMode, self.__dotFullSizeFactor, self.__antialiasing, self.__pen, self.__brush)
+            else:
+                atlas = HalftoneSpriteAtlas.atlas(self.__drawMode, self.__dotSize, self.__antialiasing, self.__pen, self.__brush)
+
+        if atlas is not None:
+            def paintBatch(canvas, dotsX, dotsY, radiusX, radiusY):
+                atlas.paint(canvas, dotsX, dotsY, radiusX, self.__paintSprite)
+        elif self.__drawMode == HalftoneRenderer.DRAW_MODE_CIRCLE:
+            paintBatch = self.__paintCircles
+        elif self.__drawMode == HalftoneRenderer.DRAW_MODE_DIAMOND:
+            if dotsList[2] == dotsList[3]:
+                # no steadiness variation, diamonds are squares rotated by 45°
+                paintBatch = self.__paintDiamondsAsSquares
+            else:
+                paintBatch = self.__paintDiamonds
+        elif self.__drawMode == HalftoneRenderer.DRAW_MODE_SQUARE:
+            paintBatch = self.__paintSquares
+        else:
+            paintBatch = self.__paintLines
+
+        totalLoop = len(dotsList[0])
+
+        for first in range(0, totalLoop, HalftoneRenderer.BATCH_SIZE):
+            last = first + HalftoneRenderer.BATCH_SIZE
+            paintBatch(canvas, dotsList[0][first:last], dotsList[1][first:last], dotsList[2][first:last], dotsList[3][first:last])
+
+            if progressCallback is not None:
+                progressCallback(min(last, totalLoop) / totalLoop)
+
+    def __paintSprite(self, canvas, fXSrc, fYSrc, fRadius):
+        """Paint one dot for a sprite"""
+        canvas.setPen(QPen(self.__pen))
+        canvas.setBrush(QBrush(self.__brush))
+        canvas.setRenderHint(QPainter.Antialiasing, self.__antialiasing)
+
+        if self.__drawMode == HalftoneRenderer.DRAW_MODE_CIRCLE:
+            self.__paintCircles(canvas, [fXSrc], [fYSrc], [fRadius], [fRadius])
+        else:
+            self.__paintDiamonds(canvas, [fXSrc], [fYSrc], [fRadius], [fRadius])
+
+    def __paintCircles(self, canvas, dotsX, dotsY, radiusX, radiusY):
+        """Paint circle dots"""
+        # note: tested alternatives (QPainterPath, points with a round pen) are
+        #       slower than an ellipse per dot
+        for fXSrc, fYSrc, fRadiusX, fRadiusY in zip(dotsX, dotsY, radiusX, radiusY):
+            canvas.drawEllipse(QPointF(fXSrc, fYSrc), fRadiusX, fRadiusY)
+
+    def __paintDiamonds(self, canvas, dotsX, dotsY, radiusX, radiusY):
+        """Paint diamond dots"""
+        for fXSrc, fYSrc, fRadiusX, fRadiusY in zip(dotsX, dotsY, radiusX, radiusY):
+            canvas.drawPolygon(QPolygonF([QPointF(fXSrc, fYSrc - fRadiusY),
+                                          QPointF(fXSrc + fRadiusX, fYSrc),
+                                          QPointF(fXSrc, fYSrc + fRadiusY),
+                                          QPointF(fXSrc - fRadiusX, fYSrc)])
+                               )
+
+    def __paintDiamondsAsSquares(self, canvas, dotsX, dotsY, radiusX, radiusY):
+        """Paint diamond dots for which radius X and Y are the same
+
+        Diamonds are painted as squares, in a coordinates system rotated by 45°
+        """
+        # a diamond with radius r is a square with a side of r*sqrt(2)
+        # center (x, y) is (x+y, y-x)/sqrt(2) in rotated coordinates system
+        factor = sqrt(0.5)
+
+        canvas.save()
+        canvas.rotate(45)
+        canvas.drawRects([QRectF((fXSrc + fYSrc - fRadius) * factor, (fYSrc - fXSrc - fRadius) * factor, 2 * fRadius * factor, 2 * fRadius * factor)
+                          for fXSrc, fYSrc, fRadius in zip(dotsX, dotsY, radiusX)])
+        canvas.restore()
+
+    def __paintSquares(self, canvas, dotsX, dotsY, radiusX, radiusY):
+        """Paint square dots"""
+        canvas.drawRects([QRectF(fXSrc - fRadiusX, fYSrc - fRadiusY, fRadiusX, fRadiusY)
+                          for fXSrc, fYSrc, fRadiusX, fRadiusY in zip(dotsX, dotsY, radiusX, radiusY)])
+
+    def __paintLines(self, canvas, dotsX, dotsY, radiusX, radiusY):
+        """Paint line dots
+
+        Lines are painted in a coordinates system rotated according to screen
+        angle, in which all lines are horizontal; pen width is given by radius X
+        - width 0: cosmetic pen, all lines painted with one call
+        - width lower or equal than 1: Qt use a specific rasterization for thin
+          lines, painted one by one with pen
+        - otherwise, a line is a rectangle (flat cap) or a rounded rectangle
+          (round cap) painted with pen brush; rectangles are painted with one
+          call
+        """
+        dotSize = self.__dotSize
+        dotHSize = self.__dotHSize
+        roundCap = (self.__pen.capStyle() == Qt.RoundCap)
+
+        if self.__drawMode == HalftoneRenderer.DRAW_MODE_LINEFLAT and self.__rotation != 0:
+            lineLeft = -0.5
+            lineRight = dotSize + 0.5
+        else:
+            lineLeft = 0
+            lineRight = dotSize
+        lineWidth = lineRight - lineLeft
+
+        # center (x, y) in rotated coordinates system
+        rotCos = cos(radians(self.__rotationD))
+        rotSin = sin(radians(self.__rotationD))
+        dotsU = [fXSrc * rotCos + fYSrc * rotSin for fXSrc, fYSrc in zip(dotsX, dotsY)]
+        dotsV = [fYSrc * rotCos - fXSrc * rotSin + dotHSize for fXSrc, fYSrc in zip(dotsX, dotsY)]
+
+        pen = QPen(self.__pen)
+        brush = QBrush(self.__pen.brush())
+
+        canvas.save()
+        canvas.rotate(self.__rotationD)
+
+        # lines are grouped by consecutive lines of same kind, to keep painting order
+        for lineKind, lines in groupby(zip(dotsU, dotsV, radiusX), key=lambda line: 0 if line[2] == 0 else 1 if line[2] <= 1 else 2):
+            if lineKind == 0:
+                pen.setWidthF(0)
+                canvas.setPen(pen)
+                canvas.drawLines([QLineF(fU + lineLeft, fV, fU + lineRight, fV) for fU, fV, fWidth in lines])
+            elif lineKind == 1:
+                for fU, fV, fWidth in lines:
+                    pen.setWidthF(fWidth)
+                    canvas.setPen(pen)
+                    canvas.drawLine(QPointF(fU + lineLeft, fV), QPointF(fU + lineRight, fV))
+            else:
+                canvas.setPen(QPen(Qt.NoPen))
+                canvas.setBrush(brush)
+                if roundCap:
+                    for fU, fV, fWidth in lines:
+                        fHWidth = fWidth / 2
+                        canvas.drawRoundedRect(QRectF(fU + lineLeft - fHWidth, fV - fHWidth, lineWidth + fWidth, fWidth), fHWidth, fHWidth)
+                else:
+                    canvas.drawRects([QRectF(fU + lineLeft, fV - fWidth / 2, lineWidth, fWidth) for fU, fV, fWidth in lines])
+
+        canvas.restore()
+
+    def paintStrip(self, width, height, bgColor, top, stripHeight, margin, dotsX, dotsY, radiusX, radiusY):
+        """Paint given dots for rows `top` to `top + stripHeight` of a `width` x `height`
+        image, and return a new image on which these rows are painted
+
+        Qt rasterization depends of painter origin and clipping, then to get
+        exactly the same pixels than a complete image rendering:
+        - returned image starts from row 0 (no translation)
+        - returned image ends `margin` rows after strip (no clipping)
+        Only rows around strip are filled and painted, other rows content is
+        undefined
+        """
+        returned = QImage(width, min(height, top + stripHeight + margin), QImage.Format_ARGB32_Premultiplied)
+
+        canvas = QPainter()
+        canvas.begin(returned)
+        canvas.setCompositionMode(QPainter.CompositionMode_Source)
+        # painted dots centers are at least at `top - margin`
+        canvas.fillRect(QRect(0, top - 2 * margin, width, stripHeight + 3 * margin), bgColor)
+        canvas.setCompositionMode(QPainter.CompositionMode_SourceOver)
+        self.paint(canvas, dotsX, dotsY, radiusX, radiusY)
+        canvas.end()
+
+        return returned
+
+    def strips(self, height, threads):
+        """Return list of strips (top, height) for given image height and number of threads"""
+        # more strips than threads, to keep all threads busy until the end
+        stripHeight = max(HalftoneRenderer.STRIP_MIN_HEIGHT, ceil(height / (4 * threads)))
+        return [(top, min(stripHeight, height - top)) for top in range(0, height, stripHeight)]
+
+    def stripsDots(self, strips, margin, dotsX, dotsY, radiusX, radiusY):
+        """Return, for each strip, dots (x, y, radiusX, radiusY) that have to be painted on strip
+
+        A dot is painted on a strip if its center is in strip rows, or outside
+        strip rows from less than `margin` pixels
+        Dots order is kept
+        """
+        if not isinstance(dotsX, list):
+            returned = []
+            for top, height in strips:
+                inStrip = (dotsY >= top - margin) & (dotsY < top + height + margin)
+                returned.append((dotsX[inStrip], dotsY[inStrip], radiusX[inStrip], radiusY[inStrip]))
+            return returned
+
+        returned = [([], [], [], []) for strip in strips]
+        stripHeight = strips[0][1]
+        lastStrip = len(strips) - 1
+        for fXSrc, fYSrc, fRadiusX, fRadiusY in zip(dotsX, dotsY, radiusX, radiusY):
+            first = max(0, int((fYSrc - margin) // stripHeight))
+            last = min(lastStrip, int((fYSrc + margin) // stripHeight))
+            for index in range(first, last + 1):
+                top, height = strips[index]
+                if top - margin <= fYSrc < top + height + margin:
+                    stripDots = returned[index]
+                    stripDots[0].append(fXSrc)
+                    stripDots[1].append(fYSrc)
+                    stripDots[2].append(fRadiusX)
+                    stripDots[3].append(fRadiusY)
+        return returned
+
+    def paintThreaded(self, canvas, width, height, bgColor, dotsX, dotsY, radiusX, radiusY, threads=0, progressCallback=None):
+        """Paint given dots on given `canvas` (an active QPainter, on a `width` x `height` device
+        filled with `bgColor`)
+
+        Image is split in horizontal strips; strips are painted in parallel by
+        worker threads, and then copied on canvas
+        Result is the same than paint() result, pixel for pixel
+
+        If provided, `progressCallback` is called after each strip with the
+        ratio of work done (0.0 to 1.0)
+        """
+        threads = HalftoneRenderer.idealThreadCount(threads)
+        if threads == 1 or height <= HalftoneRenderer.STRIP_MIN_HEIGHT:
+            self.paint(canvas, dotsX, dotsY, radiusX, radiusY, progressCallback)
+            return
+
+        strips = self.strips(height, threads)
+        margin = self.margin(radiusX, radiusY)
+        stripsDots = self.stripsDots(strips, margin, dotsX, dotsY, radiusX, radiusY)
+
+        # strips rows are copied as is
+        canvas.save()
+        canvas.setCompositionMode(QPainter.CompositionMode_Source)
+
+        # strips without dots are not painted
+        stripsDone = len([dots for dots in stripsDots if len(dots[0]) == 0])
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            pending = {}
+            for (top, stripHeight), dots in zip(strips, stripsDots):
+                if len(dots[0]) == 0:
+                    # nothing to paint, canvas is already filled with background
+                    continue
+                future = executor.submit(self.paintStrip, width, height, bgColor, top, stripHeight, margin, *dots)
+                pending[future] = QRect(0, top, width, stripHeight)
+
+            try:
+                while len(pending) > 0:
+                    done, notDone = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stripRect = pending.pop(future)
+                        canvas.drawImage(stripRect, future.result(), stripRect)
+
+                        if progressCallback is not None:
+                            stripsDone += 1
+                            progressCallback(stripsDone / len(strips))
+            except BaseException:
+                # process interrupted (by progress callback, to cancel it):
+                # strips not started are not painted
+                for future in pending:
+                    future.cancel()
+                raise
+
+        canvas.restore()
+
+
+class HalftoneScreen:
+    """Threshold array halftone engine (AM screening, like a RIP)
+
+    Instead of painting dots, a threshold is calculated for each pixel from
+    its position in screen cell (distance to dot center, according to dot
+    shape) and compared to pixel value: cost is linear with number of pixels,
+    without any per dot python code
+
+    When antialiasing is active, pixels on dots edges are partially inked
+    according to their distance to edge
+
+    Dots shapes and positions are the same than dots painted by HalftoneRenderer
+    except that:
+    - dots size is defined per pixel (each pixel is compared to its own value,
+      not to the average value of cell)
+    - squares are centered on cells
+    - steadiness variation is not applied
+
+    Needs NumPy
+    """
+
+    # number of rows processed in one pass
+    BAND_HEIGHT = 128
+
+    def __init__(self, drawMode, color, antialiasing, dotSize, dotFullSizeFactor, dotOffset, origin, transformMatrix, rotation, rotationD):
+        """Initialise screen
+
+        Screen cells centers are defined like HalftoneSampler lattice: `origin`
+        (x, y) is the first cell center and `dotOffset` the distance between
+        cells, before `transformMatrix` is applied
+        """
+        self.__drawMode = drawMode
+        self.__color = QColor(color)
+        self.__antialiasing = antialiasing
+        self.__dotSize = dotSize
+        self.__dotHSize = dotSize / 2
+        self.__dotOffset = dotOffset
+        self.__origin = origin
+        self.__transformMatrix = transformMatrix
+        self.__rotationD = rotationD
+
+        # distance, in pixels, from dot center to dot edge for a full coverage
+        # and gradient of distance function
+        self.__gradient = 1
+        if drawMode in (HalftoneRenderer.DRAW_MODE_CIRCLE, HalftoneRenderer.DRAW_MODE_DIAMOND):
+            if dotFullSizeFactor != 1:
+                self.__fullRadius = dotFullSizeFactor
+            else:
+                self.__fullRadius = dotSize
+
+            if drawMode == HalftoneRenderer.DRAW_MODE_DIAMOND:
+                self.__gradient = sqrt(2)
+        else:
+            # square side / line width is equal to dot size
+            self.__fullRadius = self.__dotHSize
+
+        if drawMode == HalftoneRenderer.DRAW_MODE_LINEFLAT and rotation != 0:
+            self.__lineLeft = -0.5
+            self.__lineRight = dotSize + 0.5
+        else:
+            self.__lineLeft = 0
+            self.__lineRight = dotSize
+
+    def __latticeCoordinates(self, pixelX, pixelY):
+        """Return coordinates of given pixels in lattice (before rotation), in cell units"""
+        if self.__transformMatrix is not None:
+            # inverse of HalftoneSampler.transform()
+            matrix = self.__transformMatrix
+            xt = pixelX - matrix[0][2]
+            yt = pixelY - matrix[1][2]
+            pixelX, pixelY = (xt * matrix[0][0] + yt * matrix[1][0] + matrix[0][2],
+                              xt * matrix[0][1] + yt * matrix[1][1] + matrix[1][2])
+
+        return ((pixelX - self.__origin[0]) / self.__dotOffset,
+                (pixelY - self.__origin[1]) / self.__dotOffset)
+
+    def __deviceOffset(self, cellU, cellV):
+        """Return offset (in pixels, device axis) for given offsets in lattice (in cell units)"""
+        cellU = cellU * self.__dotOffset
+        cellV = cellV * self.__dotOffset
+        if self.__transformMatrix is None:
+            return (cellU, cellV)
+
+        matrix = self.__transformMatrix
+        return (cellU * matrix[0][0] + cellV * matrix[0][1],
+                cellU * matrix[1][0] + cellV * matrix[1][1])
+
+    def threshold(self, top, height, width, left=0):
+        """Return threshold array for rows `top` to `top + height` and columns
+        `left` to `left + width`
+
+        Threshold is the distance, in pixels, from pixel center to dot center,
+        divided by distance for a full size dot: a pixel is inked when coverage
+        is greater than threshold
+        """
+        pixelX, pixelY = numpy.meshgrid(numpy.arange(left, left + width, dtype=numpy.float64) + 0.5,
+                                        numpy.arange(top, top + height, dtype=numpy.float64) + 0.5)
+
+        if self.__drawMode == HalftoneRenderer.DRAW_MODE_CIRCLE:
+            # nearest cell center
+            cellU, cellV = self.__latticeCoordinates(pixelX, pixelY)
+            offsetX, offsetY = self.__deviceOffset(cellU - numpy.round(cellU), cellV - numpy.round(cellV))
+            distance = numpy.sqrt(offsetX * offsetX + offsetY * offsetY)
+        elif self.__drawMode in (HalftoneRenderer.DRAW_MODE_DIAMOND, HalftoneRenderer.DRAW_MODE_SQUARE):
+            # shapes are aligned on device axis, not on (rotated) lattice: nearest
+            # dot is searched within the 4 cells around pixel
+            cellU, cellV = self.__latticeCoordinates(pixelX, pixelY)
+            cellU -= numpy.floor(cellU)
+            cellV -= numpy.floor(cellV)
+            distance = None
+            for deltaU, deltaV in ((0, 0), (1, 0), (0, 1), (1, 1)):
+                offsetX, offsetY = self.__deviceOffset(cellU - deltaU, cellV - deltaV)
+                if self.__drawMode == HalftoneRenderer.DRAW_MODE_DIAMOND:
+                    cellDistance = numpy.abs(offsetX) + numpy.abs(offsetY)
+                else:
+                    cellDistance = numpy.maximum(numpy.abs(offsetX), numpy.abs(offsetY))
+
+                if distance is None:
+                    distance = cellDistance
+                else:
+                    numpy.minimum(distance, cellDistance, out=distance)
+        else:
+            # lines, in coordinates system rotated according to line angle, in
+            # which cells centers are at (i * dotOffset, j * dotOffset)
+            if self.__transformMatrix is None:
+                originX, originY = self.__origin
+            else:
+                originX, originY = HalftoneSampler.transform(self.__origin[0], self.__origin[1], self.__transformMatrix)
+
+            rotCos = cos(radians(self.__rotationD))
+            rotSin = sin(radians(self.__rotationD))
+            pixelX -= originX
+            pixelY -= originY
+            lineU = numpy.mod(pixelX * rotCos + pixelY * rotSin, self.__dotOffset)
+            lineV = pixelY * rotCos - pixelX * rotSin - self.__dotHSize
+
+            distance = numpy.abs(lineV - self.__dotOffset * numpy.round(lineV / self.__dotOffset))
+
+            # distance to line segment ends, for current and next cell
+            outside = numpy.minimum(numpy.maximum(numpy.maximum(self.__lineLeft - lineU, lineU - self.__lineRight), 0),
+                                    numpy.maximum(numpy.maximum(self.__lineLeft - lineU + self.__dotOffset, lineU - self.__dotOffset - self.__lineRight), 0))
+
+            if self.__drawMode == HalftoneRenderer.DRAW_MODE_LINEFLAT:
+                distance[outside > 0] = numpy.inf
+            else:
+                distance = numpy.sqrt(distance * distance + outside * outside)
+
+        return distance / self.__fullRadius
+
+    def __renderBand(self, srcArray, dstArray, top, height, bgColor, desaturate):
+        """Render rows `top` to `top + height`"""
+        if desaturate is None:
+            # work on 1byte only (all RGB byte have same value)
+            srcValue = srcArray[top:top + height, :, 0]
+        else:
+            srcValue = HalftoneSeparation.gray(srcArray[top:top + height], desaturate)
+
+        # pixel coverage, calculated like HalftoneSampler (transparent pixels are not inked)
+        if srcArray.dtype.kind == 'f':
+            # high color depth, no rounding
+            coverage = ((255 - srcValue) * srcArray[top:top + height, :, 3]) / 65025
+        else:
+            value = srcValue.astype(numpy.int32)
+            alpha = srcArray[top:top + height, :, 3].astype(numpy.int32)
+            coverage = (((255 - value) * alpha) // 255) / 255
+
+        # colors are premultiplied (BGRA order)
+        fgColor = numpy.array([self.__color.blue(), self.__color.green(), self.__color.red(), 255], dtype=numpy.float64) * (self.__color.alpha() / 255)
+        bgColor = numpy.array([bgColor.blue(), bgColor.green(), bgColor.red(), 255], dtype=numpy.float64) * (bgColor.alpha() / 255)
+
+        # a white pixel is never inked: threshold is only calculated between
+        # first and last inked columns of band
+        inkedColumns = numpy.flatnonzero(coverage.any(axis=0))
+        if len(inkedColumns) == 0:
+            dstArray[top:top + height] = numpy.rint(bgColor).astype(numpy.uint8)
+            return
+        left = int(inkedColumns[0])
+        right = int(inkedColumns[-1]) + 1
+
+        threshold = self.threshold(top, height, right - left, left)
+
+        ink = numpy.zeros(coverage.shape, dtype=numpy.float64)
+        inkedCoverage = coverage[:, left:right]
+        if self.__antialiasing:
+            # distance (in pixels) between pixel center and dot edge
+            ink[:, left:right] = numpy.clip((inkedCoverage - threshold) * (self.__fullRadius / self.__gradient) + 0.5, 0, 1)
+        else:
+            ink[:, left:right] = (inkedCoverage > threshold)
+        ink[coverage == 0] = 0
+
+        dstArray[top:top + height] = numpy.rint(bgColor + ink[:, :, None] * (fgColor - bgColor)).astype(numpy.uint8)
+
+    def render(self, imgSrc, bgColor, threads=0, progressCallback=None, desaturate=None):
+        """Return halftone for given source image (an ARGB32 QImage, or a float
+        array from HalftonePixels) as an ARGB32_Premultiplied QImage
+
+        Image is processed by bands of rows, in parallel by worker threads
+        If provided, `progressCallback` is called when bands are done with the
+        ratio of work done (0.0 to 1.0)
+
+        If a `desaturate` type is provided, gray values are calculated from
+        pixels of bands (see HalftoneSampler.sample())
+        """
+        width, height = HalftoneSampler.imageSize(imgSrc)
+        returned = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+
+        srcArray = HalftoneSampler.imageArray(imgSrc)
+        dstArray = HalftoneSampler.imageArray(returned, True)
+
+        bands = [(top, min(HalftoneScreen.BAND_HEIGHT, height - top)) for top in range(0, height, HalftoneScreen.BAND_HEIGHT)]
+
+        with ThreadPoolExecutor(max_workers=HalftoneRenderer.idealThreadCount(threads)) as executor:
+            pending = [executor.submit(self.__renderBand, srcArray, dstArray, top, height, bgColor, desaturate) for top, height in bands]
+
+            try:
+                while len(pending) > 0:
+                    done, notDone = wait(pending, return_when=FIRST_COMPLETED)
+                    pending = list(notDone)
+                    for future in done:
+                        # raise exception from worker, if any
+                        future.result()
+
+                    if progressCallback is not None:
+                        progressCallback((len(bands) - len(pending)) / len(bands))
+            except BaseException:
+                # process interrupted (by progress callback, to cancel it):
+                # bands not started are not rendered
+                for future in pending:
+                    future.cancel()
+                raise
+
+        return returned
@@ -20,7 +20,6 @@ from math import (
     )
 import os
 import os.path
-import random
 import re
 import sys
 import time
@@ -35,6 +34,17 @@ from krita import (
         Selection
     )
 
+from collections import OrderedDict
+from concurrent.futures import (
+        ThreadPoolExecutor,
+        FIRST_COMPLETED,
+        wait
+    )
+from threading import (
+        Event,
+        Lock
+    )
+
 from PyQt5.Qt import *
 from PyQt5 import QtCore
 from PyQt5.QtCore import (
@@ -47,8 +57,7 @@ from PyQt5.QtCore import (
 from PyQt5.QtGui import (
         QColor,
         QImage,
-        QPixmap,
-        QPolygonF
+        QPixmap
     )
 from PyQt5.QtWidgets import (
         QApplication,
@@ -79,6 +88,16 @@ if __name__ != '__main__':
             EKritaNode
         )
 
+    from .halftone import (
+            NUMPY_AVAILABLE,
+            HalftonePixels,
+            HalftoneRenderer,
+            HalftoneSampler,
+            HalftoneScreen,
+            HalftoneSeparation,
+            HalftoneSeparationPlan
+        )
+
     PLUGIN_EXEC_FROM = 'KRITA'
 else:
     # Execution from 'Scripter' plugin?
@@ -105,6 +124,22 @@ else:
             EKritaNode
         )
 
+    if 'newspaper.halftone' in sys.modules:
+        from importlib import reload
+        reload(sys.modules['newspaper.halftone'])
+    else:
+        import newspaper.halftone
+
+    from newspaper.halftone import (
+            NUMPY_AVAILABLE,
+            HalftonePixels,
+            HalftoneRenderer,
+            HalftoneSampler,
+            HalftoneScreen,
+            HalftoneSeparation,
+            HalftoneSeparationPlan
+        )
+
     PLUGIN_EXEC_FROM = 'SCRIPTER_PLUGIN'
 
 
@@ -117,6 +152,11 @@ PLUGIN_DIALOG_TITLE = "{0} - {1}".format('Newspaper', PLUGIN_VERSION)
 DBOX_INFO = 'i'
 DBOX_WARNING = 'w'
 
+# delay (in ms) after last option change before style preview is generated
+STYLE_PREVIEW_DELAY = 150
+# maximum size (in bytes) of style previews kept in cache
+STYLE_PREVIEW_CACHE_SIZE = 16 * 1024 * 1024
+
 
 # Define Output modes
 OUTPUT_MODE_MONO = i18n('Monochrome')
@@ -125,6 +165,7 @@ OUTPUT_MODE_CMYK = i18n('Four color (CMYK - Pictures)')
 OUTPUT_MODE_CMYrK = i18n('Four color (CMY+K - Pictures)')
 OUTPUT_MODE_CMYpK1 = i18n('Four color (CMY+K - Comics #1)')
 OUTPUT_MODE_CMYpK2 = i18n('Four color (CMY+K - Comics #2)')
+OUTPUT_MODE_CMYKICC = i18n('Four color (CMYK - Color profile)')
 
 # define precision method to calculate current dot size
 OUTPUT_SAMPLING_LOW = i18n('Low')
@@ -135,6 +176,12 @@ OUTPUT_ANTIALIASING_NONE = i18n('None')
 OUTPUT_ANTIALIASING_NORMAL = i18n('Normal')
 OUTPUT_ANTIALIASING_SOFT = i18n('Soft')
 
+# define how halftone is built
+# - dots: sample cells and paint dots
+# - threshold screen: compare pixels to a threshold array (needs NumPy)
+OUTPUT_ENGINE_DOTS = i18n('Dots')
+OUTPUT_ENGINE_SCREEN = i18n('Threshold screen')
+
 OUTPUT_DOT_STYLE_CIRCLE = i18n('Circle')
 OUTPUT_DOT_STYLE_DIAMOND = i18n('Diamond')
 OUTPUT_DOT_STYLE_SQUARE = i18n('Square')
@@ -1167,6 +1214,76 @@ OUTPUT_MODE_NFO = {
                     },
 
                 ]
+    },
+    OUTPUT_MODE_CMYKICC: {
+        'description': 'Decompose image a into four color CMYK halftone, from conversion of image to a CMYK color profile',
+        'groupLayerName': 'Newspaper (CMYK ICC)',
+        'layers': [
+                    {
+                        'color': 'K',
+                        'process': [
+                                {
+                                    'action': 'separate',
+                                    'value': 'K'                       # ink amount from color conversion
+                                },
+                                {
+                                    'action': 'newspaper',
+                                    'value': None                      # automatically use right configuration
+                                }
+                            ]
+                    },
+                    {
+                        'color': 'Y',
+                        'process': [
+                                {
+                                    'action': 'separate',
+                                    'value': 'Y'                       # ink amount from color conversion
+                                },
+                                {
+                                    'action': 'blending mode',
+                                    'value': 'multiply'
+                                },
+                                {
+                                    'action': 'newspaper',
+                                    'value': None                      # automatically use right configuration
+                                }
+                            ]
+                    },
+                    {
+                        'color': 'M',
+                        'process': [
+                                {
+                                    'action': 'separate',
+                                    'value': 'M'                       # ink amount from color conversion
+                                },
+                                {
+                                    'action': 'blending mode',
+                                    'value': 'multiply'
+                                },
+                                {
+                                    'action': 'newspaper',
+                                    'value': None                      # automatically use right configuration
+                                }
+                            ]
+                    },
+                    {
+                        'color': 'C',
+                        'process': [
+                                {
+                                    'action': 'separate',
+                                    'value': 'C'                       # ink amount from color conversion
+                                },
+                                {
+                                    'action': 'blending mode',
+                                    'value': 'multiply'
+                                },
+                                {
+                                    'action': 'newspaper',
+                                    'value': None                      # automatically use right configuration
+                                }
+                            ]
+                    }
+                ]
     }
 }
 
@@ -1203,6 +1320,198 @@ TRANSLATIONS_DICT = {
 }
 
 
+class NewspaperCancelled(Exception):
+    """Raised when process is cancelled by user"""
+    pass
+
+
+class NewspaperProgress:
+    """Progress of a process
+
+    A process is made of tasks weighted by their cost: a number of units
+    (pixels, or 1 for a layer operation) multiplied by the cost of one unit for
+    the kind of task, measured on previous tasks
+    Render tasks are executed by worker threads, others tasks by main thread:
+    time during which main thread waits for render is not included in
+    measured durations (see pause())
+
+    Progress of tasks can be updated from any thread: values are only stored,
+    without any Qt call; progress bar (and remaining times if it's a progress
+    dialog) is updated from main thread by refresh(), at most every
+    REFRESH_INTERVAL seconds
+    """
+
+    REFRESH_INTERVAL = 0.1
+
+    # progress bar range
+    RANGE = 1000
+
+    # tasks kinds
+    KIND_LAYER = 'layer'                # an operation on layers (Krita API)
+    KIND_SEPARATE = 'separate'          # in memory separation, per pixel
+    KIND_RENDER = 'render'              # halftone rendering, per pixel
+
+    # cost (in seconds) of one unit of work for tasks kinds
+    COSTS = {
+            KIND_LAYER: 0.02,
+            KIND_SEPARATE: 0.00000002,
+            KIND_RENDER: 0.0000002
+        }
+    __costsLock = Lock()
+
+    def __init__(self, progress, title):
+        """Initialise progress for given progress widget (a QProgressBar, a
+        QProgressDialog or None)"""
+        self.__progress = progress
+        self.__title = title
+        # key = task key, value = [kind, units, weight, label, ratio done, start time,
+        #                           paused time of main thread when task started]
+        self.__tasks = {}
+        self.__totalWeight = 0
+        self.__startTime = time.time()
+        self.__lastRefresh = 0
+        # duration during which main thread waited for render tasks
+        self.__pausedTime = 0
+        self.__pauseStart = None
+
+        if progress is not None:
+            progress.setRange(0, NewspaperProgress.RANGE)
+            progress.setValue(0)
+
+    def __duration(self, value):
+        """Return given duration (in seconds) as a string"""
+        value = ceil(value)
+        return "{0}:{1:02d}".format(value // 60, value % 60)
+
+    def addTask(self, key, kind, units=1, label=None):
+        """Add a task to process
+
+        If a `label` is provided, progress and remaining time of task are
+        displayed
+        """
+        weight = max(1, units) * NewspaperProgress.COSTS[kind]
+        self.__tasks[key] = [kind, units, weight, label, 0.0, None, 0]
+        self.__totalWeight += weight
+
+    def pause(self):
+        """Main thread starts to wait for render tasks"""
+        self.__pauseStart = time.time()
+
+    def resume(self):
+        """Main thread stops to wait for render tasks"""
+        self.__pausedTime += time.time() - self.__pauseStart
+
+    def start(self, key):
+        """Start task"""
+        self.__tasks[key][5] = time.time()
+        self.__tasks[key][6] = self.__pausedTime
+
+    def update(self, key, ratio):
+        """Set ratio of work done (0.0 to 1.0) for task"""
+        self.__tasks[key][4] = ratio
+
+    def done(self, key):
+        """Set task done
+
+        Cost of task kind is updated from measured duration
+        """
+        task = self.__tasks[key]
+        task[4] = 1.0
+        if task[5] is not None and task[1] > 0:
+            duration = time.time() - task[5]
+            if task[0] != NewspaperProgress.KIND_RENDER:
+                duration -= self.__pausedTime - task[6]
+
+            with NewspaperProgress.__costsLock:
+                NewspaperProgress.COSTS[task[0]] = (NewspaperProgress.COSTS[task[0]] + max(0, duration) / task[1]) / 2
+
+    def refresh(self, force=False):
+        """Update progress bar and process events
+
+        Must be called from main thread
+        """
+        currentTime = time.time()
+        if not force and currentTime - self.__lastRefresh < NewspaperProgress.REFRESH_INTERVAL:
+            return
+        self.__lastRefresh = currentTime
+
+        if self.__progress is None:
+            # no progress bar, but user interface is kept responsive
+            QApplication.instance().processEvents()
+            return
+
+        tasks = list(self.__tasks.values())
+        if self.__totalWeight > 0:
+            ratio = min(1.0, sum([task[2] * task[4] for task in tasks]) / self.__totalWeight)
+        else:
+            ratio = 1.0
+
+        self.__progress.setValue(round(ratio * NewspaperProgress.RANGE))
+
+        if isinstance(self.__progress, QProgressDialog):
+            text = [self.__title]
+            if ratio > 0:
+                text.append(i18n('Remaining time: {0}').format(self.__duration((currentTime - self.__startTime) * (1 - ratio) / ratio)))
+
+            channels = []
+            for kind, units, weight, label, taskRatio, startTime, pausedTime in tasks:
+                if label is None:
+                    continue
+                elif taskRatio >= 1:
+                    channels.append(i18n('{0}: done').format(label))
+                elif startTime is None:
+                    channels.append(i18n('{0}: waiting').format(label))
+                elif taskRatio > 0:
+                    channels.append(i18n('{0}: {1}% ({2})').format(label, int(100 * taskRatio), self.__duration((currentTime - startTime) * (1 - taskRatio) / taskRatio)))
+                else:
+                    channels.append(i18n('{0}: 0%').format(label))
+            if len(channels) > 0:
+                text.append('    '.join(channels))
+
+            self.__progress.setLabelText('\n'.join(text))
+
+        QApplication.instance().processEvents()
+
+
+class NewspaperPreviewCache:
+    """Least recently used cache of rendered previews
+
+    Previews (QImage or QPixmap) are kept while total size of their pixels
+    doesn't exceed maximum size (in bytes); otherwise least recently used
+    previews are released
+    """
+
+    def __init__(self, maxSize):
+        self.__maxSize = maxSize
+        self.__size = 0
+        # key = preview key, value = preview
+        # ordered from least to most recently used
+        self.__items = OrderedDict()
+
+    def __imageSize(self, image):
+        """Return size (in bytes) of given image pixels"""
+        return image.width() * image.height() * image.depth() // 8
+
+    def get(self, key):
+        """Return preview for given key, or None if not in cache"""
+        returned = self.__items.get(key)
+        if returned is not None:
+            self.__items.move_to_end(key)
+        return returned
+
+    def set(self, key, image):
+        """Add preview for given key"""
+        if key in self.__items:
+            self.__size -= self.__imageSize(self.__items.pop(key))
+
+        self.__items[key] = image
+        self.__size += self.__imageSize(image)
+
+        # last added preview is always kept
+        while self.__size > self.__maxSize and len(self.__items) > 1:
+            self.__size -= self.__imageSize(self.__items.popitem(last=False)[1])
+
+
 class Newspaper(Extension):
 
     def __init__(self, parent):
@@ -1217,8 +1526,10 @@ class Newspaper(Extension):
                 'outputSize': 8,
                 'outputAdjustment': 0,
                 'outputSteadiness': 10,
+                'outputSteadinessSeed': 0,
                 'outputSampling': OUTPUT_SAMPLING_MEDIUM,
                 'outputAntialasing': OUTPUT_ANTIALIASING_NORMAL,
+                'outputEngine': OUTPUT_ENGINE_DOTS,
 
                 'outputMonoDesaturateMode': OUTPUT_MONO_DESMODE_AVERAGE,
                 'outputMonoRotation': 45,
@@ -1226,18 +1537,19 @@ class Newspaper(Extension):
                 'outputMonoBg': QColor(0xFFFFFFFF),
                 'outputMonoBgTransparent': False,
 
-                'output4CScreenAngle': OUTPUT_4C_SCREENANGLE_US
+                'output4CScreenAngle': OUTPUT_4C_SCREENANGLE_US,
+                'output4CColorProfile': ''
             }
 
         self.__sourceDocument = None
         self.__sourceLayer = None
 
         self.__checkerBoardBrush = QBrush()
-        self.__pixmapStylePreviewBlack = {
+        self.__imageStylePreviewBlack = {
                 'mono': None,
                 '4c': None
             }
-        self.__pixmapStylePreviewCMYK = {
+        self.__imageStylePreviewCMYK = {
                 'mono': None,
                 '4c': None
             }
@@ -1248,8 +1560,24 @@ class Newspaper(Extension):
         self.__iconSizeStylePreview = None
         self.__pixmapStylePreviewApplied = None
         self.__stylePreviewModelNeedRefresh = False
+        # cancellation event of style preview currently generated, if any
+        self.__stylePreviewCancelled = None
+        # preview is currently generated; previews are not generated while
+        # another one is generated (user interface is refreshed during render)
+        self.__previewInProgress = False
+        # preview has been asked while style preview was generated
+        self.__previewNeedRefresh = False
+        # rendered style previews, for options and preview size
+        self.__stylePreviewCache = NewspaperPreviewCache(STYLE_PREVIEW_CACHE_SIZE)
 
         self.__lastSettingsFile = ""
+        # number of threads used to render halftone; 0 = according to number of processor cores
+        self.__renderThreads = 0
+        # in CMY/CMYK modes, render halftone of color layers in parallel
+        self.__renderChannelsConcurrently = True
+        # build layers in memory when possible: intermediate layers of output
+        # mode are not created in document, only final layers
+        self.__processInMemory = True
         self.__pluginCfgFile = os.path.join(QStandardPaths.writableLocation(QStandardPaths.GenericConfigLocation), f'krita-plugin-{EXTENSION_ID}rc.json')
         self.openCfgFile()
 
@@ -1265,7 +1593,10 @@ class Newspaper(Extension):
     def saveCfgFile(self):
         """Save configuration file"""
         jsonStruct = {
-                'lastSettingsFile': self.__lastSettingsFile
+                'lastSettingsFile': self.__lastSettingsFile,
+                'renderThreads': self.__renderThreads,
+                'renderChannelsConcurrently': self.__renderChannelsConcurrently,
+                'processInMemory': self.__processInMemory
             }
 
         with open(self.__pluginCfgFile, 'w') as file:
@@ -1289,6 +1620,12 @@ class Newspaper(Extension):
                     return False
 
             self.__lastSettingsFile = jsonAsDict['lastSettingsFile']
+            if 'renderThreads' in jsonAsDict:
+                self.__renderThreads = jsonAsDict['renderThreads']
+            if 'renderChannelsConcurrently' in jsonAsDict:
+                self.__renderChannelsConcurrently = jsonAsDict['renderChannelsConcurrently']
+            if 'processInMemory' in jsonAsDict:
+                self.__processInMemory = jsonAsDict['processInMemory']
             return True
         return False
 
@@ -1402,11 +1739,37 @@ class Newspaper(Extension):
                 return returnedColor
             return currentColor
 
-        def uiBuildStylePreview():
-            """Generate style preview"""
-            if self.__inInit:
-                return
+        def stylePreviewKey():
+            """Return key of style preview in cache, for current options and
+            preview size"""
+            currentMode = '4c'
+            if self.__outputOptions['outputMode'] == OUTPUT_MODE_MONO:
+                currentMode = 'mono'
 
+            # all 'output' options are used to render preview
+            options = []
+            for name in sorted(self.__outputOptions):
+                if name.startswith('output'):
+                    value = self.__outputOptions[name]
+                    if isinstance(value, QColor):
+                        value = value.rgba()
+                    options.append(value)
+
+            return (dlgMain.btStylePreview.frameSize().width() - 8,
+                    dlgMain.btStylePreview.frameSize().height() - 8,
+                    self.__stylePreviewModel[currentMode],
+                    tuple(options))
+
+        def uiSetStylePreview(pixmap):
+            """Set given style preview to button"""
+            self.__pixmapStylePreviewApplied = pixmap
+
+            dlgMain.btStylePreview.setIcon(QIcon(pixmap))
+            dlgMain.btStylePreview.setIconSize(pixmap.size())
+
+        def uiStylePreviewSources():
+            """Build source images of style preview models for current mode,
+            if not yet built or if preview has been resized"""
             outputWidth = dlgMain.btStylePreview.frameSize().width() - 8
             outputHeight = dlgMain.btStylePreview.frameSize().height() - 8
             iconSizeStylePreview = QSize(outputWidth, outputHeight)
@@ -1415,20 +1778,19 @@ class Newspaper(Extension):
             if self.__outputOptions['outputMode'] == OUTPUT_MODE_MONO:
                 currentMode = 'mono'
 
-            # build preview model if needed
-            if self.__pixmapStylePreviewBlack[currentMode] is None:
+            if self.__imageStylePreviewBlack[currentMode] is None or self.__imageStylePreviewBlack[currentMode].size() != iconSizeStylePreview:
                 gradient = QLinearGradient(QPointF(10, 0), QPointF(outputWidth - 10, outputHeight))
                 gradient.setColorAt(0, Qt.black)
                 gradient.setColorAt(1, Qt.white)
 
-                self.__pixmapStylePreviewBlack[currentMode] = QPixmap(outputWidth, outputHeight)
+                self.__imageStylePreviewBlack[currentMode] = QImage(outputWidth, outputHeight, QImage.Format_ARGB32_Premultiplied)
 
                 canvas = QPainter()
-                canvas.begin(self.__pixmapStylePreviewBlack[currentMode])
+                canvas.begin(self.__imageStylePreviewBlack[currentMode])
                 canvas.fillRect(QRect(0, 0, outputWidth, outputHeight), gradient)
                 canvas.end()
 
-            if self.__pixmapStylePreviewCMYK[currentMode] is None:
+            if self.__imageStylePreviewCMYK[currentMode] is None or self.__imageStylePreviewCMYK[currentMode].size() != iconSizeStylePreview:
                 gradient = QLinearGradient(QPointF(10, 0), QPointF(outputWidth - 10, outputHeight))
                 gradient.setColorAt(0, Qt.black)
                 gradient.setColorAt(0.125, Qt.white)
@@ -1440,7 +1802,7 @@ class Newspaper(Extension):
                 gradient.setColorAt(0.875, Qt.magenta)
                 gradient.setColorAt(1, Qt.red)
 
-                self.__pixmapStylePreviewCMYK[currentMode] = QPixmap(outputWidth, outputHeight)
+                self.__imageStylePreviewCMYK[currentMode] = QImage(outputWidth, outputHeight, QImage.Format_ARGB32_Premultiplied)
 
                 path = QPainterPath(QPointF(0, outputHeight/2))
                 path.cubicTo(QPointF(outputWidth * 0.125, outputHeight * 0.25), QPointF(outputWidth * 0.375, outputHeight * 0.25), QPointF(outputWidth/2, outputHeight/2))
@@ -1450,7 +1812,7 @@ class Newspaper(Extension):
                 path.closeSubpath()
 
                 canvas = QPainter()
-                canvas.begin(self.__pixmapStylePreviewCMYK[currentMode])
+                canvas.begin(self.__imageStylePreviewCMYK[currentMode])
                 canvas.fillRect(QRectF(0, 0, outputWidth, outputHeight), gradient)
                 canvas.setBrush(QBrush(QColor(Qt.black), Qt.SolidPattern))
                 canvas.setPen(QPen(Qt.NoPen))
@@ -1459,44 +1821,110 @@ class Newspaper(Extension):
 
                 canvas.end()
 
-            if self.__stylePreviewModel[currentMode] == 'black':
-                srcPixmap = self.__pixmapStylePreviewBlack[currentMode]
+        def uiBuildStylePreview():
+            """Schedule generation of style preview
+
+            Changes made in a short time are coalesced: preview is generated
+            once, STYLE_PREVIEW_DELAY ms after the last one; a preview being
+            generated for previous options is cancelled
+            A preview already generated for current options is applied
+            immediately
+            """
+            if self.__inInit:
+                return
+
+            if self.__stylePreviewCancelled is not None:
+                self.__stylePreviewCancelled.set()
+
+            # source images are also displayed while mouse is over button
+            uiStylePreviewSources()
+
+            pixmap = self.__stylePreviewCache.get(stylePreviewKey())
+            if pixmap is not None:
+                stylePreviewTimer.stop()
+                uiSetStylePreview(pixmap)
             else:
-                srcPixmap = self.__pixmapStylePreviewCMYK[currentMode]
+                stylePreviewTimer.start()
 
-            # create a temporary document to work; work on visible part of preview only
-            tmpDocument = Application.createDocument(outputWidth, outputHeight, "tmp", "RGBA", "U8", "", self.__sourceDocument.resolution())
+        def uiRenderStylePreview():
+            """Generate style preview"""
+            if self.__stylePreviewCancelled is not None or self.__previewInProgress:
+                # previous style preview is not yet cancelled, or preview is
+                # generated: try again later
+                stylePreviewTimer.start()
+                return
 
-            # create a layer used as original layer
-            tmpLayer = tmpDocument.createNode("tmpLayer", "paintlayer")
-            tmpDocument.rootNode().addChildNode(tmpLayer, None)
-            # and set original image content
-            EKritaNode.fromQPixmap(tmpLayer, srcPixmap)
+            outputWidth = dlgMain.btStylePreview.frameSize().width() - 8
+            outputHeight = dlgMain.btStylePreview.frameSize().height() - 8
+            stylePreviewCacheKey = stylePreviewKey()
+
+            currentMode = '4c'
+            if self.__outputOptions['outputMode'] == OUTPUT_MODE_MONO:
+                currentMode = 'mono'
+
+            uiStylePreviewSources()
+
+            if self.__stylePreviewModel[currentMode] == 'black':
+                srcImage = self.__imageStylePreviewBlack[currentMode]
+            else:
+                srcImage = self.__imageStylePreviewCMYK[currentMode]
 
             # execute process
-            tmpGroupLayer = self.process(tmpDocument, tmpLayer, None)
+            # (halftone is rendered by worker threads, while user interface is
+            # still refreshed)
+            self.__stylePreviewCancelled = Event()
+            try:
+                if self.canProcessImage():
+                    # in memory, without document
+                    previewImage = self.processImage(srcImage, None, self.__stylePreviewCancelled)
+                else:
+                    previewImage = self.processDocumentImage(srcImage, None, self.__stylePreviewCancelled)
+            finally:
+                self.__stylePreviewCancelled = None
+
+            if self.__previewNeedRefresh:
+                # preview asked while style preview was generated
+                self.__previewNeedRefresh = False
+                if dlgMain.isVisible():
+                    uiBuildPreview()
+
+            if previewImage is None:
+                # options changed while preview was generated: preview for new
+                # options is scheduled
+                return
 
             if self.__outputOptions['outputMonoBgTransparent']:
-                self.__pixmapStylePreviewApplied = QPixmap(outputWidth, outputHeight)
+                pixmap = QPixmap(outputWidth, outputHeight)
                 canvas = QPainter()
-                canvas.begin(self.__pixmapStylePreviewApplied)
+                canvas.begin(pixmap)
                 canvas.fillRect(QRect(0, 0, outputWidth, outputHeight), self.__checkerBoardBrush)
-                canvas.drawPixmap(0, 0, EKritaNode.toQPixmap(tmpGroupLayer))
+                canvas.drawImage(0, 0, previewImage)
                 canvas.end()
             else:
-                # self.__pixmapStylePreviewApplied = QPixmap.fromImage(QImage(tmpGroupLayer.projectionPixelData(0, 0, outputWidth, outputHeight),
-                #                                                             outputWidth, outputHeight, QImage.Format_ARGB32)
-                #                                                     )
-                self.__pixmapStylePreviewApplied = EKritaNode.toQPixmap(tmpGroupLayer)
-
-            dlgMain.btStylePreview.setIcon(QIcon(self.__pixmapStylePreviewApplied))
-            dlgMain.btStylePreview.setIconSize(iconSizeStylePreview)
+                pixmap = QPixmap.fromImage(previewImage)
 
-            tmpDocument.close()
+            self.__stylePreviewCache.set(stylePreviewCacheKey, pixmap)
+            uiSetStylePreview(pixmap)
 
         def uiBuildPreview():
-            # set size of progress bar identical to button to avoid preview being resized
+            if self.__previewInProgress:
+                # user interface is refreshed while preview is generated
+                return
+            elif self.__stylePreviewCancelled is not None:
+                # style preview is generated: cancelled, and preview is
+                # generated once style preview process is stopped
+                self.__stylePreviewCancelled.set()
+                self.__previewNeedRefresh = True
+                stylePreviewTimer.start()
+                return
+
             if not self.__inInit:
+                # dialog can't be validated while preview is generated
+                self.__previewInProgress = True
+                dlgMain.btRefresh.setEnabled(False)
+                dlgMain.dbbxOkCancel.button(QDialogButtonBox.Ok).setEnabled(False)
+
+                # set size of progress bar identical to button to avoid preview being resized
                 dlgMain.pbProgress.reset()
                 dlgMain.pbProgress.setFixedHeight(dlgMain.btRefresh.height())
                 dlgMain.btRefresh.setVisible(False)
@@ -1515,65 +1943,53 @@ class Newspaper(Extension):
                 if viewPort.height() > self.__sourceDocument.height():
                     viewPort.setHeight(self.__sourceDocument.height())
 
-                # create a temporary document to work; work on visible part of preview only
-                tmpDocument = Application.createDocument(viewPort.width(), viewPort.height(), "tmp", "RGBA", "U8", "", 120.0)
-
-                # create a layer used as original layer
-                tmpLayer = tmpDocument.createNode("tmpLayer", "paintlayer")
-                tmpDocument.rootNode().addChildNode(tmpLayer, None)
-
-                # and set original image content
-                tmpLayer.setPixelData(self.__sourceLayer.pixelData(viewPort.left(),
-                                                                   viewPort.top(),
-                                                                   viewPort.width(),
-                                                                   viewPort.height()),
-                                      0,
-                                      0,
-                                      viewPort.width(),
-                                      viewPort.height())
+                # work on visible part of preview only
+                viewPortImage = EKritaNode.toQImage(self.__sourceLayer, QRect(viewPort.left(), viewPort.top(), viewPort.width(), viewPort.height()))
 
                 # execute process
-                tmpGroupLayer = self.process(tmpDocument, tmpLayer, dlgMain.pbProgress)
-
-                # tmpLayer.setVisible(False)
-                # tmpGroupLayer.setVisible(True)
-                tmpDocument.refreshProjection()
+                try:
+                    if self.canProcessImage():
+                        # in memory, without document
+                        previewImage = self.processImage(viewPortImage, dlgMain.pbProgress)
+                    else:
+                        previewImage = self.processDocumentImage(viewPortImage, dlgMain.pbProgress)
+                finally:
+                    self.__previewInProgress = False
+                    dlgMain.btRefresh.setEnabled(True)
+                    dlgMain.dbbxOkCancel.button(QDialogButtonBox.Ok).setEnabled(True)
 
                 # prepare final rendered image
                 # a) original image with 'empty' area from processed rect
                 # b) final image image with checkerboard
                 # c) paste original image
                 # d) paste process result
-                srcPixmap = EKritaNode.toQPixmap(self.__sourceLayer, self.__sourceDocument)
+                srcImage = EKritaNode.toQImage(self.__sourceLayer, self.__sourceDocument).convertToFormat(QImage.Format_ARGB32_Premultiplied)
                 canvas = QPainter()
-                canvas.begin(srcPixmap)
+                canvas.begin(srcImage)
                 canvas.setCompositionMode(QPainter.CompositionMode_Clear)
-                canvas.fillRect(QRect(viewPort.left(), viewPort.top(), tmpDocument.width(), tmpDocument.height()), QBrush(QColor(Qt.white)))
+                canvas.fillRect(QRect(viewPort.left(), viewPort.top(), previewImage.width(), previewImage.height()), QBrush(QColor(Qt.white)))
                 canvas.end()
 
-                previewResult = QPixmap(self.__sourceDocument.width(), self.__sourceDocument.height())
+                previewResult = QImage(self.__sourceDocument.width(), self.__sourceDocument.height(), QImage.Format_ARGB32_Premultiplied)
                 canvas.begin(previewResult)
                 canvas.fillRect(QRect(0, 0, self.__sourceDocument.width(), self.__sourceDocument.height()), self.__checkerBoardBrush)
-                canvas.drawPixmap(0, 0, srcPixmap)
-                canvas.drawPixmap(viewPort.left() + tmpGroupLayer.bounds().left(),
-                                  viewPort.top() + tmpGroupLayer.bounds().top(),
-                                  EKritaNode.toQPixmap(tmpGroupLayer))
+                canvas.drawImage(0, 0, srcImage)
+                canvas.drawImage(viewPort.left(), viewPort.top(), previewImage)
                 canvas.end()
 
-                dlgMain.lblPreview.setPixmap(previewResult)
+                dlgMain.lblPreview.setPixmap(QPixmap.fromImage(previewResult))
 
-                tmpDocument.close()
                 dlgMain.pbProgress.setVisible(False)
                 dlgMain.btRefresh.setVisible(True)
             else:
-                previewResult = QPixmap(self.__sourceDocument.width(), self.__sourceDocument.height())
+                previewResult = QImage(self.__sourceDocument.width(), self.__sourceDocument.height(), QImage.Format_ARGB32_Premultiplied)
 
                 canvas = QPainter()
                 canvas.begin(previewResult)
                 canvas.fillRect(QRect(0, 0, self.__sourceDocument.width(), self.__sourceDocument.height()), self.__checkerBoardBrush)
-                canvas.drawPixmap(0, 0, EKritaNode.toQPixmap(self.__sourceLayer, self.__sourceDocument))
+                canvas.drawImage(0, 0, EKritaNode.toQImage(self.__sourceLayer, self.__sourceDocument))
                 canvas.end()
-                dlgMain.lblPreview.setPixmap(previewResult)
+                dlgMain.lblPreview.setPixmap(QPixmap.fromImage(previewResult))
 
         # ----------------------------------------------------------------------
         # Define signal and slots for UI widgets
@@ -1585,10 +2001,11 @@ class Newspaper(Extension):
 
             # mouse is over button
             if event.type() == QEvent.Enter:
+                uiStylePreviewSources()
                 if self.__stylePreviewModel[currentMode] == 'black':
-                    dlgMain.btStylePreview.setIcon(QIcon(self.__pixmapStylePreviewBlack[currentMode]))
+                    dlgMain.btStylePreview.setIcon(QIcon(QPixmap.fromImage(self.__imageStylePreviewBlack[currentMode])))
                 else:
-                    dlgMain.btStylePreview.setIcon(QIcon(self.__pixmapStylePreviewCMYK[currentMode]))
+                    dlgMain.btStylePreview.setIcon(QIcon(QPixmap.fromImage(self.__imageStylePreviewCMYK[currentMode])))
 
                 return True
             elif event.type() == QEvent.Leave:
@@ -1596,8 +2013,12 @@ class Newspaper(Extension):
                 if self.__stylePreviewModelNeedRefresh:
                     self.__stylePreviewModelNeedRefresh = False
                     uiBuildStylePreview()
-                dlgMain.btStylePreview.setIcon(QIcon(self.__pixmapStylePreviewApplied))
+                if self.__pixmapStylePreviewApplied is not None:
+                    dlgMain.btStylePreview.setIcon(QIcon(self.__pixmapStylePreviewApplied))
                 return True
+            elif event.type() == QEvent.Resize:
+                # preview for new size
+                uiBuildStylePreview()
             return False
 
         @pyqtSlot('QString')
@@ -1607,12 +2028,13 @@ class Newspaper(Extension):
                 currentMode = 'mono'
 
             # switch model for color mode
+            uiStylePreviewSources()
             if self.__stylePreviewModel[currentMode] == 'black':
                 self.__stylePreviewModel[currentMode] = 'cmyk'
-                dlgMain.btStylePreview.setIcon(QIcon(self.__pixmapStylePreviewCMYK[currentMode]))
+                dlgMain.btStylePreview.setIcon(QIcon(QPixmap.fromImage(self.__imageStylePreviewCMYK[currentMode])))
             else:
                 self.__stylePreviewModel[currentMode] = 'black'
-                dlgMain.btStylePreview.setIcon(QIcon(self.__pixmapStylePreviewBlack[currentMode]))
+                dlgMain.btStylePreview.setIcon(QIcon(QPixmap.fromImage(self.__imageStylePreviewBlack[currentMode])))
 
             self.__stylePreviewModelNeedRefresh = True
 
@@ -1651,6 +2073,9 @@ class Newspaper(Extension):
             dlgMain.lblScreenAngle.setVisible(not isVisible)
             dlgMain.cmb4CScreenAngle.setVisible(not isVisible)
 
+            dlgMain.lbl4CColorProfile.setVisible(value == OUTPUT_MODE_CMYKICC)
+            dlgMain.cmb4CColorProfile.setVisible(value == OUTPUT_MODE_CMYKICC)
+
             uiBuildStylePreview()
 
         @pyqtSlot('QString')
@@ -1668,6 +2093,11 @@ class Newspaper(Extension):
             self.__outputOptions['outputSteadiness'] = value
             uiBuildStylePreview()
 
+        @pyqtSlot(int)
+        def spbxSteadinessSeed_Changed(value):
+            self.__outputOptions['outputSteadinessSeed'] = value
+            uiBuildStylePreview()
+
         @pyqtSlot('QString')
         def cmbSampling_Changed(value):
             self.__outputOptions['outputSampling'] = value
@@ -1678,6 +2108,23 @@ class Newspaper(Extension):
             self.__outputOptions['outputAntialasing'] = value
             uiBuildStylePreview()
 
+        @pyqtSlot('QString')
+        def cmbEngine_Changed(value):
+            self.__outputOptions['outputEngine'] = value
+
+            # sampling and steadiness are not used by threshold screen
+            isEnabled = (value != OUTPUT_ENGINE_SCREEN)
+
+            dlgMain.lblSteadiness.setEnabled(isEnabled)
+            dlgMain.hsldSteadiness.setEnabled(isEnabled)
+            dlgMain.spbxSteadiness.setEnabled(isEnabled)
+            dlgMain.spbxSteadinessSeed.setEnabled(isEnabled)
+
+            dlgMain.lblSampling.setEnabled(isEnabled)
+            dlgMain.cmbSampling.setEnabled(isEnabled)
+
+            uiBuildStylePreview()
+
         @pyqtSlot('QString')
         def cmbMonoDesaturateMode_Changed(value):
             self.__outputOptions['outputMonoDesaturateMode'] = value
@@ -1711,6 +2158,11 @@ class Newspaper(Extension):
             self.__outputOptions['output4CScreenAngle'] = value
             uiBuildStylePreview()
 
+        @pyqtSlot('QString')
+        def cmb4CColorProfile_Changed(value):
+            self.__outputOptions['output4CColorProfile'] = value
+            uiBuildStylePreview()
+
         @pyqtSlot('QString')
         def cmbOriginalLayer_Changed(value):
             self.__outputOptions['originalLayerAction'] = value
@@ -1780,8 +2232,16 @@ class Newspaper(Extension):
                 dlgMain.dspbxSize.setValue(jsonAsDict['output']['dotSize'])
                 dlgMain.spbxAdjustment.setValue(jsonAsDict['output']['dotAdjustment'])
                 dlgMain.spbxSteadiness.setValue(jsonAsDict['output']['dotSteadiness'])
+                if 'dotSteadinessSeed' in jsonAsDict['output']:
+                    dlgMain.spbxSteadinessSeed.setValue(jsonAsDict['output']['dotSteadinessSeed'])
+                else:
+                    dlgMain.spbxSteadinessSeed.setValue(0)
                 dlgMain.cmbSampling.setCurrentIndex(jsonAsDict['output']['sampling'])
                 dlgMain.cmbAntialiasing.setCurrentIndex(jsonAsDict['output']['antialiasing'])
+                if 'engine' in jsonAsDict['output']:
+                    dlgMain.cmbEngine.setCurrentIndex(jsonAsDict['output']['engine'])
+                else:
+                    dlgMain.cmbEngine.setCurrentText(OUTPUT_ENGINE_DOTS)
                 dlgMain.cmbMonoDesaturateMode.setCurrentIndex(jsonAsDict['output']['desaturateMode'])
                 dlgMain.spbxMonoRotation.setValue(jsonAsDict['output']['rotation'])
                 self.__outputOptions['outputMonoFg'] = QColor(jsonAsDict['output']['foregroundColor'])
@@ -1791,6 +2251,8 @@ class Newspaper(Extension):
                 dlgMain.cbxMonoBgTransparent.setChecked(jsonAsDict['output']['backgroundIsTransparent'])
                 dlgMain.cmbMonoDesaturateMode.setCurrentIndex(jsonAsDict['output']['desaturateMode'])
                 dlgMain.cmb4CScreenAngle.setCurrentIndex(jsonAsDict['output']['screenAngle'])
+                if 'colorProfile' in jsonAsDict['output'] and dlgMain.cmb4CColorProfile.findText(jsonAsDict['output']['colorProfile']) > -1:
+                    dlgMain.cmb4CColorProfile.setCurrentText(jsonAsDict['output']['colorProfile'])
 
                 dlgMain.cmbOriginalLayer.setCurrentIndex(jsonAsDict['layerManagement']['originalLayer'])
                 dlgMain.leNewLayerGroupName.setText(jsonAsDict['layerManagement']['layerGroupName'])
@@ -1813,14 +2275,17 @@ class Newspaper(Extension):
                         'dotSize': dlgMain.dspbxSize.value(),
                         'dotAdjustment': dlgMain.spbxAdjustment.value(),
                         'dotSteadiness': dlgMain.spbxSteadiness.value(),
+                        'dotSteadinessSeed': dlgMain.spbxSteadinessSeed.value(),
                         'sampling': dlgMain.cmbSampling.currentIndex(),
                         'antialiasing': dlgMain.cmbAntialiasing.currentIndex(),
+                        'engine': dlgMain.cmbEngine.currentIndex(),
                         'desaturateMode': dlgMain.cmbMonoDesaturateMode.currentIndex(),
                         'rotation': dlgMain.spbxMonoRotation.value(),
                         'foregroundColor': self.__outputOptions['outputMonoFg'].name(),  # QColor
                         'backgroundColor': self.__outputOptions['outputMonoBg'].name(),  # QColor
                         'backgroundIsTransparent': dlgMain.cbxMonoBgTransparent.isChecked(),
-                        'screenAngle': dlgMain.cmb4CScreenAngle.currentIndex()
+                        'screenAngle': dlgMain.cmb4CScreenAngle.currentIndex(),
+                        'colorProfile': dlgMain.cmb4CColorProfile.currentText()
                     },
                     'layerManagement': {
                         'originalLayer': dlgMain.cmbOriginalLayer.currentIndex(),
@@ -1844,6 +2309,11 @@ class Newspaper(Extension):
         dlgMain.setWindowTitle(PLUGIN_DIALOG_TITLE)
         dlgMain.dialogShown.connect(onDialogShown)
 
+        stylePreviewTimer = QTimer(dlgMain)
+        stylePreviewTimer.setSingleShot(True)
+        stylePreviewTimer.setInterval(STYLE_PREVIEW_DELAY)
+        stylePreviewTimer.timeout.connect(uiRenderStylePreview)
+
         # ......................................................................
         # Define values & connectors
 
@@ -1853,7 +2323,8 @@ class Newspaper(Extension):
                 OUTPUT_MODE_CMYK,
                 OUTPUT_MODE_CMYrK,
                 OUTPUT_MODE_CMYpK1,
-                OUTPUT_MODE_CMYpK2
+                OUTPUT_MODE_CMYpK2,
+                OUTPUT_MODE_CMYKICC
             ])
         dlgMain.cmbMode.setCurrentText(self.__outputOptions['outputMode'])
         dlgMain.cmbMode.currentTextChanged.connect(cmbMode_Changed)
@@ -1884,6 +2355,9 @@ class Newspaper(Extension):
         dlgMain.hsldSteadiness.setValue(self.__outputOptions['outputSteadiness'])
         dlgMain.hsldSteadiness.valueChanged.connect(hsldSteadiness_Changed)
 
+        dlgMain.spbxSteadinessSeed.setValue(self.__outputOptions['outputSteadinessSeed'])
+        dlgMain.spbxSteadinessSeed.valueChanged.connect(spbxSteadinessSeed_Changed)
+
         dlgMain.cmbSampling.addItems([
                 OUTPUT_SAMPLING_LOW,
                 OUTPUT_SAMPLING_MEDIUM,
@@ -1900,6 +2374,21 @@ class Newspaper(Extension):
         dlgMain.cmbAntialiasing.setCurrentText(self.__outputOptions['outputAntialasing'])
         dlgMain.cmbAntialiasing.currentTextChanged.connect(cmbAntialiasing_Changed)
 
+        if NUMPY_AVAILABLE:
+            dlgMain.cmbEngine.addItems([
+                    OUTPUT_ENGINE_DOTS,
+                    OUTPUT_ENGINE_SCREEN
+                ])
+        else:
+            # threshold screen can't be used without NumPy
+            dlgMain.cmbEngine.addItems([
+                    OUTPUT_ENGINE_DOTS
+                ])
+            self.__outputOptions['outputEngine'] = OUTPUT_ENGINE_DOTS
+        dlgMain.cmbEngine.setCurrentText(self.__outputOptions['outputEngine'])
+        dlgMain.cmbEngine.currentTextChanged.connect(cmbEngine_Changed)
+        dlgMain.cmbEngine.currentTextChanged.emit(self.__outputOptions['outputEngine'])
+
         dlgMain.cmbMonoDesaturateMode.addItems([
             OUTPUT_MONO_DESMODE_LIGHTNESS,
             OUTPUT_MONO_DESMODE_LUMINOSITY709,
@@ -1933,6 +2422,14 @@ class Newspaper(Extension):
         dlgMain.cmb4CScreenAngle.setCurrentText(self.__outputOptions['output4CScreenAngle'])
         dlgMain.cmb4CScreenAngle.currentTextChanged.connect(cmb4CScreenAngle_Changed)
 
+        # profiles available for separation by color conversion
+        dlgMain.cmb4CColorProfile.addItems(Application.profiles('CMYKA', 'U8'))
+        if dlgMain.cmb4CColorProfile.findText(self.__outputOptions['output4CColorProfile']) > -1:
+            dlgMain.cmb4CColorProfile.setCurrentText(self.__outputOptions['output4CColorProfile'])
+        else:
+            self.__outputOptions['output4CColorProfile'] = dlgMain.cmb4CColorProfile.currentText()
+        dlgMain.cmb4CColorProfile.currentTextChanged.connect(cmb4CColorProfile_Changed)
+
         dlgMain.cmbOriginalLayer.addItems([
             ORIGINAL_LAYER_KEEPUNCHANGED,
             ORIGINAL_LAYER_KEEPVISIBLE,
@@ -1966,21 +2463,18 @@ class Newspaper(Extension):
         self.__inInit = False
         returned = dlgMain.exec_()
 
+        stylePreviewTimer.stop()
+        if self.__stylePreviewCancelled is not None:
+            self.__stylePreviewCancelled.set()
+
         self.saveCfgFile()
 
         return returned
 
-    def progressNext(self, pProgress):
-        """Update progress bar"""
-        if pProgress is not None:
-            stepCurrent = pProgress.value()+1
-            pProgress.setValue(stepCurrent)
-            QApplication.instance().processEvents()
-
     def run(self):
         """Run process for current layer"""
 
-        pdlgProgress = QProgressDialog(self.__outputOptions['outputMode'], None, 0, 100, Application.activeWindow().qwindow())
+        pdlgProgress = QProgressDialog(self.__outputOptions['outputMode'], i18n('Cancel'), 0, 100, Application.activeWindow().qwindow())
         pdlgProgress.setWindowTitle(PLUGIN_DIALOG_TITLE)
         pdlgProgress.setMinimumSize(640, 200)
         pdlgProgress.setModal(True)
@@ -1990,8 +2484,578 @@ class Newspaper(Extension):
 
         pdlgProgress.close()
 
-    def process(self, pDocument, pOriginalLayer, pProgress):
-        """Process given layer with current options"""
+    def __outputModeKey(self, outputOptions):
+        """Return key of output mode of given options in OUTPUT_MODE_NFO
+
+        In monochrome mode, layers processes depend on desaturate mode
+        """
+        outputMode = outputOptions['outputMode']
+        if outputMode == OUTPUT_MODE_MONO:
+            if outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_LIGHTNESS:
+                outputMode += '0'
+            elif outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_LUMINOSITY709:
+                outputMode += '1'
+            elif outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_LUMINOSITY601:
+                outputMode += '2'
+            elif outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_AVERAGE:
+                outputMode += '3'
+            elif outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_MINIMUM:
+                outputMode += '4'
+            elif outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_MAXIMUM:
+                outputMode += '5'
+
+        return outputMode
+
+    def __outputModeLayers(self, outputMode):
+        """Return layers processes for given output mode key
+
+        A desaturate filter followed by a newspaper action is not applied
+        on layer: gray values are calculated by newspaper action, while
+        pixels are sampled
+        """
+        returned = []
+        for layer in OUTPUT_MODE_NFO[outputMode]['layers']:
+            processes = []
+            for process in layer['process']:
+                if (process['action'] == 'newspaper' and
+                   len(processes) > 0 and
+                   processes[-1]['action'] == 'filter' and
+                   re.match("name=desaturate;type=[0-5]$", processes[-1]['value'])):
+                    processes[-1] = dict(process, desaturate=int(processes[-1]['value'][-1]))
+                else:
+                    processes.append(process)
+            returned.append({'color': layer['color'], 'process': processes})
+        return returned
+
+    def __halftoneRender(self, outputOptions, imgSrc, width, height, color, desaturate, checkCancelled):
+        """Return a function render(threads, progressCallback) that render
+        halftone of given color for source `imgSrc` (an ARGB32 QImage or a
+        pixels array of given size), as an ARGB32_Premultiplied QImage
+
+        Given `outputOptions` must be a copy of current options: render is
+        executed by a worker thread, while options can be modified from user
+        interface
+
+        If a `desaturate` type is provided, source is desaturated while
+        sampled
+        Given `checkCancelled` function is called between render stages, and
+        can raise an exception to stop render
+        """
+
+        # note:
+        # as python is slow, code in this function is made in a way that is
+        # not intuitive for a python programmer
+        # - use array instead of range (faster)
+        # - work on bits array instead of pixel object (faster)
+        # - use of many [configuration] variables instead of dictionnary (faster)
+        # - ...
+        transform = HalftoneSampler.transform
+
+        # define configuration
+        # do not use hashtable (slower access than a variable)
+        configBrush = QBrush(Qt.NoBrush)
+        configPen = QPen(Qt.NoPen)
+        configBgColor = QColor(Qt.white)
+        configRotation = 0                                                  # in radians
+        configRotationD = -outputOptions['outputMonoRotation']               # in degree
+        configSteadinessValue = outputOptions['outputSteadiness']
+        configSteadinessSeed = outputOptions['outputSteadinessSeed']
+        configWidth = width
+        configHeight = height
+        configSampling = HalftoneSampler.SAMPLING_LOW
+        configDrawMode = HalftoneRenderer.DRAW_MODE_CIRCLE
+
+        if outputOptions['outputMode'] == OUTPUT_MODE_MONO:
+            # In Monochrome mode, set background color as defined
+            if outputOptions['outputMonoBgTransparent']:
+                configBgColor = QColor(Qt.transparent)
+            else:
+                configBgColor = outputOptions['outputMonoBg']
+
+            configFgColor = outputOptions['outputMonoFg']
+
+            if outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEFLAT:
+                # in line mode, use pen
+                configPen = QPen(outputOptions['outputMonoFg'])
+                configPen.setCapStyle(Qt.FlatCap)
+                configPen.setJoinStyle(Qt.MiterJoin)
+            elif outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEROUND:
+                # in line mode, use pen
+                configPen = QPen(outputOptions['outputMonoFg'])
+                configPen.setCapStyle(Qt.RoundCap)
+                configPen.setJoinStyle(Qt.MiterJoin)
+            else:
+                # otherwise use brush
+                configBrush = QBrush(outputOptions['outputMonoFg'], Qt.SolidPattern)
+
+            if outputOptions['outputMonoRotation'] != 90:
+                # when rotation = 90, do same process than rotation = 0
+                configRotation = radians(outputOptions['outputMonoRotation'])
+        else:
+            appliedColor = QColor(Qt.black)
+            # in CMYK mode, according to current processed layer:
+            #   - set foreground color
+            #   - set rotation
+            appliedColor = OUTPUT_PREDEF_VALUES['4CCOLORS'][color]
+            configFgColor = appliedColor
+            configRotationD = -OUTPUT_PREDEF_VALUES[outputOptions['output4CScreenAngle']][color]
+            configRotation = radians(OUTPUT_PREDEF_VALUES[outputOptions['output4CScreenAngle']][color])
+
+            # in CMYK mode, set white background color
+            if outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEFLAT:
+                # in line mode, use pen
+                configPen = QPen(appliedColor)
+                configPen.setCapStyle(Qt.FlatCap)
+                configPen.setJoinStyle(Qt.MiterJoin)
+            elif outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEROUND:
+                # in line mode, use pen
+                configPen = QPen(appliedColor)
+                configPen.setCapStyle(Qt.FlatCap)
+                configPen.setJoinStyle(Qt.MiterJoin)
+            else:
+                configBrush = QBrush(appliedColor, Qt.SolidPattern)
+
+        # use a number, faster to check than a string
+        if outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_DIAMOND:
+            configDrawMode = HalftoneRenderer.DRAW_MODE_DIAMOND
+        elif outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_SQUARE:
+            configDrawMode = HalftoneRenderer.DRAW_MODE_SQUARE
+        elif outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEFLAT:
+            configDrawMode = HalftoneRenderer.DRAW_MODE_LINEFLAT
+        elif outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEROUND:
+            configDrawMode = HalftoneRenderer.DRAW_MODE_LINEROUND
+
+        # Calculate dot geometry
+        dotSize = outputOptions['outputSize']
+        dotAdjustmentValue = dotSize * outputOptions['outputAdjustment']/100
+        dotOffset = dotSize + dotAdjustmentValue
+
+        dotiSize = int(dotSize)
+        dotHSize = dotSize / 2
+        dotiHSize = int(dotHSize)
+
+        dotFullSizeFactor = 1
+        if outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_CIRCLE:
+            # Calculate factor for rendering 'circle dots' that fill 100% of cell
+            #
+            #   Cell: area for a 'dot'
+            #           Inside square:
+            #               W                   : Defined option size
+            #               r = W/2             : Half width
+            #                                     [=> dotHSize]
+            #
+            #           Outside circle:
+            #               A 100% black dot
+            #               When dot is 100% size, cell is full Black
+            #               => Dot radius equals to hypotenuse of half-square
+            #
+            #               R = sqrt(2r²)       : full size radius
+            #                                     [=> dotFullSizeFactor]
+            #
+            #           *******
+            #         **+-----+**
+            #        ** |   R/| **
+            #       **  |   / |  **
+            #       **  |  +--+--**
+            #       **  |    r| R**
+            #        ** |  W  | **
+            #         **+-----+**
+            #           *******
+            #
+            dotFullSizeFactor = sqrt(2*dotHSize*dotHSize)
+        elif outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_DIAMOND:
+            # Calculate factor for rendering 'diamoond dots' that fill 100% of cell
+            # These are calculated now to improve calculation performances
+            #
+            #   Cell: area for a 'dot'
+            #           Inside square:
+            #               W                   : Defined option size
+            #               r = W/2             : Half width
+            #                                     [=> fHSize]
+            #
+            #           Outside circle:
+            #               A 100% black dot
+            #               When dot is 100% size, cell is full Black
+            #
+            #               R = 3 * r           : full size radius
+            #                                     [=> dotFullSizeFactor]
+            #
+            #              .
+            #             / \
+            #            /   \
+            #           +-----+
+            #          /|     |\
+            #         / |     | \
+            #        .  |  +--+--.
+            #         \ |   r |R/
+            #          \|     |/
+            #           +-----+
+            #            \   /
+            #             \ /
+            #              .
+            #
+            dotFullSizeFactor = 1.5 * dotHSize
+
+        # use a number, faster to check than a string
+        if outputOptions['outputSampling'] == OUTPUT_SAMPLING_HIGH:
+            # sample made on ALL pixel
+            configSampling = HalftoneSampler.SAMPLING_HIGH
+        elif outputOptions['outputSampling'] == OUTPUT_SAMPLING_MEDIUM:
+            # sample made on one pixel on two
+            configSampling = HalftoneSampler.SAMPLING_MEDIUM
+
+        # calculate bounds
+        transformMatrix = None
+        if configRotation == 0 or configRotation == 90:
+            # no rotation, no calculation: bounds are image bounds :-)
+            xLeft = -dotiHSize
+            xRight = configWidth+dotiHSize
+
+            yTop = -dotiHSize
+            yBottom = configHeight+dotiHSize
+        else:
+            # When a rotation is applied, we need to determinate new bounds
+            # Original bounds
+            #   (0, 0)   => origin coordinates
+            #   (w, h)   => bottom/left coordinates
+            #   (cx, cy) => rotation center (w/2, h/2)
+            #
+            # Intermediate calculations
+            #   (0', 0') => rotated origin coordinates
+            #   (w', h') => rotated bottom/left coordinates
+            #
+            #       (left,top)       (w",0")       (right,top)
+            #            *              +                *
+            #                         .. ..
+            #                       ..     ..
+            #             (0,0)   ..         ..     (w,0)
+            #               +---..-------------..-----+
+            #               | ..                -..   |
+            #               ..                     .. |
+            #             ..|                        ..
+            #     (0',0')+  |         (cx,cy)         |..
+            #             ..|            o            |  +(w',h')
+            #               ..                        |..
+            #               | ..                     ..
+            #               |   ..                 .. |
+            #               |     ..             ..   |
+            #               +-------..---------..-----+
+            #             (0,h)       ..     ..     (w,h)
+            #                           .. ..
+            #            *                +              *
+            #       (left,bottom)      (0",h")     (right,bottom)
+            #
+            #
+            # New bounds are defined by:
+            #   (left,top)      = (MIN(0, 0'), MIN(0, 0"))
+            #   (right,bottom)  = (MAX(w, w'), MAX(h, h"))
+            #
+            # applied rotation do not rotate image, but rotate scanline angle
+
+            # calculate sinus and cosinus
+            rotCos = cos(-configRotation)
+            rotSin = sin(-configRotation)
+
+            xMiddle = configWidth / 2
+            yMiddle = configHeight / 2
+
+            transformMatrix = [[rotCos, -rotSin, xMiddle],
+                               [rotSin, rotCos, yMiddle]]
+
+            xLeft, tmp = transform(0, 0, transformMatrix)
+            xRight, tmp = transform(configWidth, configHeight, transformMatrix)
+
+            tmp, yTop = transform(configWidth, 0, transformMatrix)
+            tmp, yBottom = transform(0, configHeight, transformMatrix)
+
+            xLeft = min(0, xLeft)
+            xRight = max(configWidth, xRight)
+
+            yTop = min(0, yTop)
+            yBottom = max(configHeight, yBottom)
+
+        # calculate positions
+        xPositions = [(xLeft + dotOffset * v) for v in range(ceil((xRight - xLeft) / dotOffset))]
+        yPositions = [(yTop + dotOffset * v) for v in range(ceil((yBottom - yTop) / dotOffset))]
+
+        def render(threads, progressCallback):
+            """Render halftone from source image
+
+            Doesn't use Krita API, then can be executed outside main thread
+            """
+            occupancy = None
+            checkCancelled()
+            if NUMPY_AVAILABLE:
+                # coarse mask of areas with something to draw
+                # - a zero coverage dot is not visible, except in line mode
+                #   (a line with a zero width is painted with a cosmetic pen)
+                # - threshold screen never ink white pixels
+                occupancy = HalftoneSampler.occupancy(imgSrc,
+                                                      outputOptions['outputEngine'] == OUTPUT_ENGINE_SCREEN or
+                                                      configDrawMode not in (HalftoneRenderer.DRAW_MODE_LINEFLAT, HalftoneRenderer.DRAW_MODE_LINEROUND),
+                                                      desaturate)
+
+                if not occupancy.any():
+                    # nothing to draw on whole layer (for example, no yellow
+                    # on a grayscale image): background only
+                    workingImage = QImage(configWidth, configHeight, QImage.Format_ARGB32_Premultiplied)
+                    workingImage.fill(configBgColor)
+
+                    if progressCallback is not None:
+                        progressCallback(1.0)
+                    return workingImage
+
+            if outputOptions['outputEngine'] == OUTPUT_ENGINE_SCREEN and NUMPY_AVAILABLE:
+                # threshold screen: each pixel is compared to screen
+                # threshold, no dot sampling/drawing
+                screen = HalftoneScreen(configDrawMode,
+                                        configFgColor,
+                                        (outputOptions['outputAntialasing'] != OUTPUT_ANTIALIASING_NONE),
+                                        dotSize,
+                                        dotFullSizeFactor,
+                                        dotOffset,
+                                        (xLeft, yTop),
+                                        transformMatrix,
+                                        configRotation,
+                                        configRotationD)
+                return screen.render(imgSrc, configBgColor, threads, progressCallback, desaturate)
+
+            # calculate dots to draw
+            # (made in bulk with NumPy when available)
+            dotsX, dotsY, dotsCoverage = HalftoneSampler.sample(imgSrc, xPositions, yPositions, transformMatrix, dotiSize, configSampling, occupancy, desaturate)
+            checkCancelled()
+
+            renderer = HalftoneRenderer(configDrawMode,
+                                        configBrush,
+                                        configPen,
+                                        (outputOptions['outputAntialasing'] != OUTPUT_ANTIALIASING_NONE),
+                                        dotSize,
+                                        dotFullSizeFactor,
+                                        configRotation,
+                                        configRotationD)
+            dotsRadiusX, dotsRadiusY = renderer.radius(dotsCoverage, configSteadinessValue, dotsX, dotsY, configSteadinessSeed)
+            checkCancelled()
+
+            # WorkingImage define image on which newspaper effect will be built
+            # (QPixmap can't be used outside main thread)
+            workingImage = QImage(configWidth, configHeight, QImage.Format_ARGB32_Premultiplied)
+            workingImage.fill(configBgColor)
+
+            canvas = QPainter()
+            canvas.begin(workingImage)
+            try:
+                renderer.paintThreaded(canvas, configWidth, configHeight, configBgColor,
+                                       dotsX, dotsY, dotsRadiusX, dotsRadiusY,
+                                       threads,
+                                       progressCallback)
+            finally:
+                # also when cancelled
+                canvas.end()
+
+            return workingImage
+
+        return render
+
+    def canProcessImage(self):
+        """Return True if current output mode can be processed by processImage()
+
+        Layers processes must be made in memory (see HalftoneSeparationPlan),
+        without ink separation (conversion to CMYK is made by Krita)
+        """
+        if not NUMPY_AVAILABLE:
+            return False
+
+        plan = HalftoneSeparationPlan(self.__outputModeLayers(self.__outputModeKey(self.__outputOptions)), ('normal', 255))
+        if not plan.isValid():
+            return False
+
+        for step in plan.steps():
+            if 'source' in step and 'ink' in [key[0] for key in plan.inputKeys(step['source'])]:
+                return False
+        return True
+
+    def processImage(self, pImage, pProgress=None, pCancelled=None):
+        """Process given image with current options, without Krita document
+
+        Used for previews: layers processes are made in memory on pixels
+        arrays and final layers are composed, then current output mode must
+        be supported (see canProcessImage())
+        Pixels are processed by a worker thread while user interface is
+        refreshed; process can be cancelled when given `pCancelled` event is
+        set, then None is returned
+
+        Return an ARGB32 image of same size than given image
+        """
+        # options can be modified from user interface while image is processed
+        outputOptions = dict(self.__outputOptions)
+        renderThreads = self.__renderThreads
+
+        image = pImage.convertToFormat(QImage.Format_ARGB32)
+        imageWidth = image.width()
+        imageHeight = image.height()
+        originalPixels = HalftoneSampler.imageArray(image)
+
+        # processed area: image content, with a margin of one dot
+        processBounds = QRect(0, 0, imageWidth, imageHeight)
+        contentBounds = HalftoneSeparation.bounds(originalPixels)
+        if contentBounds is not None:
+            processMargin = ceil(max(outputOptions['outputSize'], outputOptions['outputSize'] * (1 + outputOptions['outputAdjustment'] / 100)))
+            processBounds = QRect(*contentBounds).adjusted(-processMargin, -processMargin, processMargin, processMargin).intersected(processBounds)
+        processWidth = processBounds.width()
+        processHeight = processBounds.height()
+
+        plan = HalftoneSeparationPlan(self.__outputModeLayers(self.__outputModeKey(outputOptions)), ('normal', 255))
+
+        progress = NewspaperProgress(pProgress, outputOptions['outputMode'])
+        for index, step in enumerate(plan.steps()):
+            if step['action'] in ('newspaper', 'create'):
+                progress.addTask(('step', index), NewspaperProgress.KIND_SEPARATE, processWidth * processHeight)
+            else:
+                progress.addTask(('step', index), NewspaperProgress.KIND_LAYER)
+
+            if step['action'] == 'newspaper':
+                progress.addTask(('render', step['color']), NewspaperProgress.KIND_RENDER, processWidth * processHeight)
+
+        if pCancelled is None:
+            cancelled = Event()
+        else:
+            cancelled = pCancelled
+
+        def checkCancelled():
+            """Raise NewspaperCancelled if process has been cancelled"""
+            if cancelled.is_set():
+                raise NewspaperCancelled()
+
+        def workerProgress(key, ratio):
+            """Progress callback of render"""
+            checkCancelled()
+            progress.update(key, ratio)
+
+        def renderLayer(color, sourcePixels, desaturate):
+            """Return pixels of a layer on which halftone of given source
+            pixels is applied"""
+            key = ('render', color)
+            progress.start(key)
+            returned = HalftoneSeparation.transparent(processWidth, processHeight)
+
+            bounds = HalftoneSeparation.bounds(sourcePixels)
+            if bounds is not None:
+                x, y, width, height = bounds
+                render = self.__halftoneRender(outputOptions, sourcePixels[y:y+height, x:x+width], width, height, color, desaturate, checkCancelled)
+                workingImage = render(renderThreads, lambda ratio: workerProgress(key, ratio)).convertToFormat(QImage.Format_ARGB32)
+
+                if outputOptions['outputAntialasing'] == OUTPUT_ANTIALIASING_SOFT:
+                    # same radius than gaussian blur filter applied on layer
+                    returned[y:y+height, x:x+width] = HalftoneSeparation.blur(HalftoneSampler.imageArray(workingImage), 0.67)
+                else:
+                    returned[y:y+height, x:x+width] = HalftoneSampler.imageArray(workingImage)
+
+            progress.done(key)
+            return returned
+
+        def processPixels():
+            """Build final layers, and return the composed image"""
+            # key = color, value = pixels array of layer
+            colorLayers = {}
+            # key = color, value = (blendingMode, opacity)
+            colorProperties = {}
+
+            def inputs(key):
+                """Return pixels of input operation of plan"""
+                if key[0] == 'original':
+                    return originalPixels[processBounds.top():processBounds.bottom() + 1, processBounds.left():processBounds.right() + 1]
+                return colorLayers[key[1]]
+
+            for index, step in enumerate(plan.steps()):
+                checkCancelled()
+                progress.start(('step', index))
+                if step['action'] == 'newspaper':
+                    sourcePixels = plan.pixels(step['source'], processWidth, processHeight, inputs)
+                    plan.stepDone(index)
+                    progress.done(('step', index))
+                    colorLayers[step['color']] = renderLayer(step['color'], sourcePixels, step['desaturate'])
+                    continue
+                elif step['action'] == 'create':
+                    colorLayers[step['color']] = plan.pixels(step['source'], processWidth, processHeight, inputs)
+                elif step['action'] == 'properties':
+                    colorProperties[step['color']] = (step['blendingMode'], step['opacity'])
+                elif step['action'] == 'remove':
+                    colorLayers.pop(step['color'])
+
+                plan.stepDone(index)
+                progress.done(('step', index))
+            plan.clear()
+
+            # layers are composed like in group layer, from bottom to top
+            pixels = HalftoneSeparation.transparent(processWidth, processHeight)
+            for color in colorLayers:
+                blendingMode, opacity = colorProperties.get(color, ('normal', 255))
+                pixels = HalftoneSeparation.compose(pixels, colorLayers[color], blendingMode, opacity)
+
+            returned = QImage(imageWidth, imageHeight, QImage.Format_ARGB32)
+            returned.fill(Qt.transparent)
+            HalftoneSampler.imageArray(returned, True)[processBounds.top():processBounds.bottom() + 1, processBounds.left():processBounds.right() + 1] = pixels
+            return returned
+
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(processPixels)
+        while not future.done():
+            wait([future], timeout=NewspaperProgress.REFRESH_INTERVAL)
+            progress.refresh()
+        executor.shutdown()
+
+        try:
+            returned = future.result()
+        except NewspaperCancelled:
+            return None
+
+        progress.refresh(True)
+        return returned
+
+    def processDocumentImage(self, pImage, pProgress=None, pCancelled=None):
+        """Process given image with current options, in a temporary document
+
+        Used for previews when current output mode can't be processed by
+        processImage()
+        Return an ARGB32 image of same size than given image, or None if
+        process has been cancelled
+        """
+        # create a temporary document to work
+        tmpDocument = Application.createDocument(pImage.width(), pImage.height(), "tmp", "RGBA", "U8", "", self.__sourceDocument.resolution())
+
+        # create a layer used as original layer
+        tmpLayer = tmpDocument.createNode("tmpLayer", "paintlayer")
+        tmpDocument.rootNode().addChildNode(tmpLayer, None)
+        # and set original image content
+        EKritaNode.fromQImage(tmpLayer, pImage)
+
+        returned = None
+        tmpGroupLayer = self.process(tmpDocument, tmpLayer, pProgress, pCancelled)
+        if tmpGroupLayer is not None:
+            # pixels data are copied before document is closed
+            returned = EKritaNode.toQImage(tmpGroupLayer, tmpDocument).copy()
+        elif pCancelled is None or not pCancelled.is_set():
+            # nothing to process (empty image)
+            returned = QImage(pImage.width(), pImage.height(), QImage.Format_ARGB32)
+            returned.fill(Qt.transparent)
+
+        tmpDocument.close()
+        return returned
+
+    def process(self, pDocument, pOriginalLayer, pProgress, pCancelled=None):
+        """Process given layer with current options
+
+        Pixels are processed by worker threads, Krita API is used from main
+        thread only
+        Process can be cancelled if given progress is a QProgressDialog, or
+        when given `pCancelled` event is set: then document is left untouched
+        and None is returned
+        None is also returned when there's nothing to process (empty layer,
+        or selection outside layer content)
+        """
+
+        # options can be modified from user interface while layer is processed
+        outputOptions = dict(self.__outputOptions)
 
         self.layerNum = 0
         document = pDocument
@@ -2027,11 +3091,15 @@ class Newspaper(Extension):
                     srcLayer = originalLayer
                 else:
                     # a color layer previously built (and finished)
-                    srcLayer = getLayerByName(parentGroupLayer, parseLayerName(self.__outputOptions['layerColorName'], srcName[1]))
+                    srcLayer = getLayerByName(parentGroupLayer, parseLayerName(outputOptions['layerColorName'], srcName[1]))
             else:
                 # a layer with a fixed name
                 srcLayer = document.nodeByName(parseLayerName(value, ''))
 
+            if srcName is not None and srcName[1] in pendingNewspaper:
+                # a color layer for which halftone is currently rendered: need to wait
+                applyPendingNewspaper([srcName[1]])
+
             if srcLayer is not None:
                 newLayer = srcLayer.duplicate()
 
@@ -2039,6 +3107,8 @@ class Newspaper(Extension):
                 newLayer.setName("np-d{0}".format(self.layerNum))
 
                 parentGroupLayer.addChildNode(newLayer, currentProcessedLayer)
+                # content outside processed bounds (selection) is ignored
+                newLayer.cropNode(processBounds.left(), processBounds.top(), processBounds.width(), processBounds.height())
 
                 return newLayer
             else:
@@ -2060,7 +3130,7 @@ class Newspaper(Extension):
                 infoObject = InfoObject()
                 infoObject.setProperty("color", value['color'])
                 selection = Selection()
-                selection.select(0, 0, document.width(), document.height(), 255)
+                selection.select(processBounds.left(), processBounds.top(), processBounds.width(), processBounds.height(), 255)
 
                 newLayer = document.createFillLayer(value['color'].name(), "color", infoObject, selection)
 
@@ -2078,6 +3148,39 @@ class Newspaper(Extension):
             else:
                 return None
 
+        def inkPixelData(color):
+            """Return pixels data (RGBA/U8, processed bounds) of gray values for
+            ink amount of given color
+
+            Original layer is converted to CMYK color profile only once
+            """
+            if separationCache.get('cmyk') is None:
+                colorProfile = outputOptions['output4CColorProfile']
+                if colorProfile not in Application.profiles('CMYKA', 'U8'):
+                    colorProfile = Application.profiles('CMYKA', 'U8')[0]
+
+                cmykLayer = originalLayer.duplicate()
+                parentGroupLayer.addChildNode(cmykLayer, None)
+                cmykLayer.setColorSpace('CMYKA', 'U8', colorProfile)
+                separationCache['cmyk'] = cmykLayer.pixelData(processBounds.left(), processBounds.top(), processBounds.width(), processBounds.height())
+                cmykLayer.remove()
+
+            return HalftoneSeparation.inkPixelData(separationCache['cmyk'], color)
+
+        def separateLayer(currentProcessedLayer, value):
+            """Create a new layer with ink amount of given color, as gray values
+               New layer become active layer
+            """
+            self.layerNum += 1
+            newLayer = document.createNode("np-s{0}".format(self.layerNum), "paintlayer")
+            parentGroupLayer.addChildNode(newLayer, currentProcessedLayer)
+
+            if newLayer.colorModel() != 'RGBA' or newLayer.colorDepth() != 'U8':
+                newLayer.setColorSpace("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc")
+            newLayer.setPixelData(inkPixelData(value), processBounds.left(), processBounds.top(), processBounds.width(), processBounds.height())
+
+            return newLayer
+
         def removeLayer(currentProcessedLayer, value):
             """Remove layer"""
             currentProcessedLayer.remove()
@@ -2101,7 +3204,7 @@ class Newspaper(Extension):
             # (works if the merged layer was the last from parent node)
             currentProcessedLayer = parentGroupLayer.childNodes()[-1]
             # for an unknown reason, merged layer bounds are not corrects... :'-(
-            currentProcessedLayer.cropNode(0, 0, document.width(), document.height())
+            currentProcessedLayer.cropNode(processBounds.left(), processBounds.top(), processBounds.width(), processBounds.height())
             return currentProcessedLayer
 
         def applyBlendingMode(currentProcessedLayer, value):
@@ -2140,453 +3243,157 @@ class Newspaper(Extension):
                     filterConfiguration.setProperty(parameterName.group(1), parameterName.group(2).replace(r'\;', ';'))
 
             filter.setConfiguration(filterConfiguration)
-            filter.apply(currentProcessedLayer, 0, 0, document.width(), document.height())
+            filter.apply(currentProcessedLayer, processBounds.left(), processBounds.top(), processBounds.width(), processBounds.height())
 
             return currentProcessedLayer
 
-        def applyNewspaper(currentProcessedLayer, value, color):
-            """Apply newspaper style to layer"""
+        def applyNewspaper(currentProcessedLayer, value, color, source=None, desaturate=None):
+            """Apply newspaper style to layer
 
-            # note:
-            # as python is slow, code in this function is made in a way that is
-            # not intuitive for a python programmer
-            # - use array instead of range (faster)
-            # - work on bits array instead of pixel object (faster)
-            # - use of many [configuration] variables instead of dictionnary (faster)
-            # - ...
-            def transform(x, y, matrix):
-                """Calculate new coordinates according to given transformation matrix"""
-                xt = x - matrix[0][2]
-                yt = y - matrix[1][2]
-                return (xt * matrix[0][0] + yt * matrix[0][1] + matrix[0][2],
-                        xt * matrix[1][0] + yt * matrix[1][1] + matrix[1][2])
-
-            # if not pProgress is None:
-            #    print(f"Newspaper execution duration[{color}]: start")
-            #    startTime = time.time()
-
-            # define configuration
-            # do not use hashtable (slower access than a variable)
-            configBrush = QBrush(Qt.NoBrush)
-            configPen = QPen(Qt.NoPen)
-            configBgColor = QColor(Qt.white)
-            configRotation = 0                                                  # in radians
-            configRotationD = -self.__outputOptions['outputMonoRotation']        # in degree
-            configSteadinessValue = self.__outputOptions['outputSteadiness']
-            configSteadinessApplied = (self.__outputOptions['outputSteadiness'] < 10)
-            configWidth = currentProcessedLayer.bounds().width()
-            configHeight = currentProcessedLayer.bounds().height()
-            configSampling = True
-            configSamplingRange = []
-            configDrawMode = 0  # Circle
+            Halftone is rendered by executor and a future is returned; the future
+            result has to be applied to layer with applyNewspaperResult()
 
-            if self.__outputOptions['outputMode'] == OUTPUT_MODE_MONO:
-                # In Monochrome mode, set background color as defined
-                if self.__outputOptions['outputMonoBgTransparent']:
-                    configBgColor = QColor(Qt.transparent)
-                else:
-                    configBgColor = self.__outputOptions['outputMonoBg']
-
-                if self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEFLAT:
-                    # in line mode, use pen
-                    configPen = QPen(self.__outputOptions['outputMonoFg'])
-                    configPen.setCapStyle(Qt.FlatCap)
-                    configPen.setJoinStyle(Qt.MiterJoin)
-                elif self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEROUND:
-                    # in line mode, use pen
-                    configPen = QPen(self.__outputOptions['outputMonoFg'])
-                    configPen.setCapStyle(Qt.RoundCap)
-                    configPen.setJoinStyle(Qt.MiterJoin)
-                else:
-                    # otherwise use brush
-                    configBrush = QBrush(self.__outputOptions['outputMonoFg'], Qt.SolidPattern)
+            If a `source` is provided, it's a tuple (pixels, bounds) used as
+            source instead of layer content
 
-                if self.__outputOptions['outputMonoRotation'] != 90:
-                    # when rotation = 90, do same process than rotation = 0
-                    configRotation = radians(self.__outputOptions['outputMonoRotation'])
-            else:
-                appliedColor = QColor(Qt.black)
-                # in CMYK mode, according to current processed layer:
-                #   - set foreground color
-                #   - set rotation
-                appliedColor = OUTPUT_PREDEF_VALUES['4CCOLORS'][color]
-                configRotationD = -OUTPUT_PREDEF_VALUES[self.__outputOptions['output4CScreenAngle']][color]
-                configRotation = radians(OUTPUT_PREDEF_VALUES[self.__outputOptions['output4CScreenAngle']][color])
-
-                # in CMYK mode, set white background color
-                if self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEFLAT:
-                    # in line mode, use pen
-                    configPen = QPen(appliedColor)
-                    configPen.setCapStyle(Qt.FlatCap)
-                    configPen.setJoinStyle(Qt.MiterJoin)
-                elif self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEROUND:
-                    # in line mode, use pen
-                    configPen = QPen(appliedColor)
-                    configPen.setCapStyle(Qt.FlatCap)
-                    configPen.setJoinStyle(Qt.MiterJoin)
-                else:
-                    configBrush = QBrush(appliedColor, Qt.SolidPattern)
-
-            # use a number, faster to check than a string
-            if self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_DIAMOND:
-                configDrawMode = 1
-            elif self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_SQUARE:
-                configDrawMode = 2
-            elif self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEFLAT:
-                configDrawMode = 3
-            elif self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_LINEROUND:
-                configDrawMode = 4
-
-            # Calculate dot geometry
-            dotSize = self.__outputOptions['outputSize']
-            dotAdjustmentValue = dotSize * self.__outputOptions['outputAdjustment']/100
-            dotOffset = dotSize + dotAdjustmentValue
-
-            dotiSize = int(dotSize)
-            dotHSize = dotSize / 2
-            dotiHSize = int(dotHSize)
-
-            dotFullSizeFactor = 1
-            if self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_CIRCLE:
-                # Calculate factor for rendering 'circle dots' that fill 100% of cell
-                #
-                #   Cell: area for a 'dot'
-                #           Inside square:
-                #               W                   : Defined option size
-                #               r = W/2             : Half width
-                #                                     [=> dotHSize]
-                #
-                #           Outside circle:
-                #               A 100% black dot
-                #               When dot is 100% size, cell is full Black
-                #               => Dot radius equals to hypotenuse of half-square
-                #
-                #               R = sqrt(2r²)       : full size radius
-                #                                     [=> dotFullSizeFactor]
-                #
-                #           *******
-                #         **+-----+**
-                #        ** |   R/| **
-                #       **  |   / |  **
-                #       **  |  +--+--**
-                #       **  |    r| R**
-                #        ** |  W  | **
-                #         **+-----+**
-                #           *******
-                #
-                dotFullSizeFactor = sqrt(2*dotHSize*dotHSize)
-            elif self.__outputOptions['outputDotStyle'] == OUTPUT_DOT_STYLE_DIAMOND:
-                # Calculate factor for rendering 'diamoond dots' that fill 100% of cell
-                # These are calculated now to improve calculation performances
-                #
-                #   Cell: area for a 'dot'
-                #           Inside square:
-                #               W                   : Defined option size
-                #               r = W/2             : Half width
-                #                                     [=> fHSize]
-                #
-                #           Outside circle:
-                #               A 100% black dot
-                #               When dot is 100% size, cell is full Black
-                #
-                #               R = 3 * r           : full size radius
-                #                                     [=> dotFullSizeFactor]
-                #
-                #              .
-                #             / \
-                #            /   \
-                #           +-----+
-                #          /|     |\
-                #         / |     | \
-                #        .  |  +--+--.
-                #         \ |   r |R/
-                #          \|     |/
-                #           +-----+
-                #            \   /
-                #             \ /
-                #              .
-                #
-                dotFullSizeFactor = 1.5 * dotHSize
-
-            # Calculate ranges for on each pixel processing
-            # (made now to avoid recalculation on each loop)
-            if self.__outputOptions['outputSampling'] == OUTPUT_SAMPLING_HIGH:
-                # sample made on ALL pixel
-                configSamplingRange = [v for v in range(0, dotiSize, 1)]
-            elif self.__outputOptions['outputSampling'] == OUTPUT_SAMPLING_MEDIUM:
-                # sample made on one pixel on two
-                configSamplingRange = [v for v in range(0, dotiSize, 2)]
-            else:  # (self.__outputOptions['outputSampling'] == OUTPUT_SAMPLING_LOW:
-                # sample made on current pixel only
-                configSampling = False
-
-            # calculate bounds
-            if configRotation == 0 or configRotation == 90:
-                # no rotation, no calculation: bounds are image bounds :-)
-                xLeft = -dotiHSize
-                xRight = configWidth+dotiHSize
-
-                yTop = -dotiHSize
-                yBottom = configHeight+dotiHSize
+            If a `desaturate` type is provided, source is desaturated while
+            sampled
+            """
+
+            if source is None:
+                bounds = currentProcessedLayer.bounds()
             else:
-                # When a rotation is applied, we need to determinate new bounds
-                # Original bounds
-                #   (0, 0)   => origin coordinates
-                #   (w, h)   => bottom/left coordinates
-                #   (cx, cy) => rotation center (w/2, h/2)
-                #
-                # Intermediate calculations
-                #   (0', 0') => rotated origin coordinates
-                #   (w', h') => rotated bottom/left coordinates
-                #
-                #       (left,top)       (w",0")       (right,top)
-                #            *              +                *
-                #                         .. ..
-                #                       ..     ..
-                #             (0,0)   ..         ..     (w,0)
-                #               +---..-------------..-----+
-                #               | ..                -..   |
-                #               ..                     .. |
-                #             ..|                        ..
-                #     (0',0')+  |         (cx,cy)         |..
-                #             ..|            o            |  +(w',h')
-                #               ..                        |..
-                #               | ..                     ..
-                #               |   ..                 .. |
-                #               |     ..             ..   |
-                #               +-------..---------..-----+
-                #             (0,h)       ..     ..     (w,h)
-                #                           .. ..
-                #            *                +              *
-                #       (left,bottom)      (0",h")     (right,bottom)
-                #
-                #
-                # New bounds are defined by:
-                #   (left,top)      = (MIN(0, 0'), MIN(0, 0"))
-                #   (right,bottom)  = (MAX(w, w'), MAX(h, h"))
-                #
-                # applied rotation do not rotate image, but rotate scanline angle
-
-                # calculate sinus and cosinus
-                rotCos = cos(-configRotation)
-                rotSin = sin(-configRotation)
-
-                xMiddle = configWidth / 2
-                yMiddle = configHeight / 2
-
-                transformMatrix = [[rotCos, -rotSin, xMiddle],
-                                   [rotSin, rotCos, yMiddle]]
-
-                xLeft, tmp = transform(0, 0, transformMatrix)
-                xRight, tmp = transform(configWidth, configHeight, transformMatrix)
-
-                tmp, yTop = transform(configWidth, 0, transformMatrix)
-                tmp, yBottom = transform(0, configHeight, transformMatrix)
-
-                xLeft = min(0, xLeft)
-                xRight = max(configWidth, xRight)
-
-                yTop = min(0, yTop)
-                yBottom = max(configHeight, yBottom)
-
-            # calculate positions
-            xPositions = [(xLeft + dotOffset * v) for v in range(ceil((xRight - xLeft) / dotOffset))]
-            yPositions = [(yTop + dotOffset * v) for v in range(ceil((yBottom - yTop) / dotOffset))]
+                bounds = source[1]
 
             # Source is used to determinate pixels values
-            imgSrc = EKritaNode.toQImage(currentProcessedLayer)
-            srcPixmap = QPixmap.fromImage(imgSrc)
-
-            # WorkingPixmap define pixmap on which newspaper effect will be built
-            workingPixmap = QPixmap(configWidth, configHeight)
-            workingPixmap.fill(configBgColor)
-
-            canvas = QPainter()
-            canvas.begin(workingPixmap)
-
-            canvas.setPen(configPen)
-            canvas.setBrush(configBrush)
-            canvas.setRenderHint(QPainter.Antialiasing, (self.__outputOptions['outputAntialasing'] != OUTPUT_ANTIALIASING_NONE))
-
-            # Calculate progress information
-            totalLoop = len(xPositions) * len(yPositions)
-            moduloStep = int(totalLoop / 20)             # 20 considers steps for progress bar
-            currentStepnumber = 0
-            stepInc = len(yPositions)
-
-            mWidth = configWidth + dotiSize
-            mHeight = configHeight + dotiSize
-
-            # working on bits() is faster than working on pixels
-            # pixel is stored on 4bytes:
-            # Bits[index] = blue
-            # Bits[index + 1] = green
-            # Bits[index + 2] = red
-            # Bits[index + 3] = alpha
-            imgSrcBits = imgSrc.bits()
-            imgSrcBits.setsize(imgSrc.byteCount())
-            imgSrcBitsRowLength = configWidth << 2  # << 2 = *4 but faster
-
-            # start processing image
-            for x in xPositions:
-                for y in yPositions:
-
-                    if configRotation == 0:
-                        # avoid heavy calculations...
-                        iXSrc, iYSrc = int(x), int(y)
-                        fXSrc, fYSrc = x, y
-                    else:
-                        fXSrc, fYSrc = transform(x, y, transformMatrix)
-
-                        iXSrc = int(fXSrc)
-                        iYSrc = int(fYSrc)
-
-                    if (configSampling and
-                        (iXSrc + dotiSize > mWidth or
-                         iYSrc + dotiSize > mHeight or
-                         iXSrc < -dotiSize or
-                         iYSrc < -dotiSize) or
-                        not configSampling and
-                        (iXSrc < 0 or
-                         iYSrc < 0 or
-                         iXSrc >= configWidth or
-                         iYSrc >= configHeight)):
-                        # completely outside viewport, do not process
-                        continue
-
-                    # retrieve cell area pixels
-                    if configSampling:
-                        # do an average calculation of all pixels in area to determinate dot size
-                        sumPx = 0
-                        nbPx = 0
-                        for tx in configSamplingRange:
-                            gX = iXSrc + tx
-                            if gX < 0 or gX >= configWidth:
-                                continue
-
-                            for ty in configSamplingRange:
-                                gY = iYSrc + ty
-                                if gY < 0 or gY >= configHeight:
-                                    continue
-                                # use 'x << 2' instead of 'x * 4'
-                                # because bitwise operation is faster
-                                imgSrcBitsIndex = gY * imgSrcBitsRowLength + (gX << 2)
-
-                                alpha = ord(imgSrcBits[imgSrcBitsIndex + 3])
-                                if alpha == 0xFF:
-                                    # no alpha, get value
-                                    # work on 1byte only (all RGB byte have same value)
-                                    sumPx += ord(imgSrcBits[imgSrcBitsIndex])
-                                    nbPx += 1
-                                elif alpha > 0:
-                                    # alpha, get weighted value
-                                    sumPx += 255 - int((255 - ord(imgSrcBits[imgSrcBitsIndex])) * alpha/255)
-                                    nbPx += 1
-                                # Else
-                                #   fully transparent
-                                #   do nothing
-
-                        if nbPx > 0:
-                            # some pixels have been processed
-                            fRadius = (255-sumPx/nbPx)/255
-                        else:
-                            # nothing to process
-                            continue
-                    else:
-                        # no sampling, only based on current pixel value
-
-                        # use 'x << 2' instead of 'x * 4'
-                        # because bitwise operation is faster
-                        imgSrcBitsIndex = iYSrc * imgSrcBitsRowLength + (iXSrc << 2)
-
-                        alpha = ord(imgSrcBits[imgSrcBitsIndex + 3])
-
-                        if alpha == 0:
-                            # completely transparent, do nothing and process next pixel
-                            continue
-                        elif alpha == 0xFF:
-                            # no transparency, get current value
-                            fRadius = (255 - ord(imgSrcBits[imgSrcBitsIndex])) / 255
-                        else:
-                            # with transparency, apply alpha weight
-                            # fRadius2 = (255 - (255 - ord(imgSrcBits[imgSrcBitsIndex])) * alpha/255)/255
-                            # factorized calculation
-                            fRadius = (65025 + (ord(imgSrcBits[imgSrcBitsIndex]) - 255) * alpha)/65025
-
-                    if dotFullSizeFactor != 1:
-                        fRadius *= dotFullSizeFactor
-                    else:
-                        fRadius *= dotSize
-
-                    if configSteadinessApplied:
-                        fRadiusX = fRadius * (1 + ((random.random() - 0.5) / configSteadinessValue))
-                        fRadiusY = fRadius * (1 + ((random.random() - 0.5) / configSteadinessValue))
-                    else:
-                        fRadiusX = fRadius
-                        fRadiusY = fRadius
-
-                    if configDrawMode == 0:
-                        # circle
-                        canvas.drawEllipse(QPointF(fXSrc, fYSrc), fRadiusX, fRadiusY)
-                    elif configDrawMode == 1:
-                        # diamond
-                        canvas.drawPolygon(QPolygonF([QPointF(fXSrc, fYSrc - fRadiusY),
-                                                      QPointF(fXSrc + fRadiusX, fYSrc),
-                                                      QPointF(fXSrc, fYSrc + fRadiusY),
-                                                      QPointF(fXSrc - fRadiusX, fYSrc)])
-                                           )
-                    elif configDrawMode == 2:
-                        # square
-                        canvas.fillRect(QRectF(fXSrc - fRadiusX, fYSrc - fRadiusY, fRadiusX, fRadiusY), configBrush)
-                    elif configDrawMode == 3:
-                        # line
-                        configPen.setWidthF(fRadiusX)
-                        canvas.setPen(configPen)
-
-                        canvas.save()
-                        canvas.translate(fXSrc, fYSrc)
-                        canvas.rotate(configRotationD)
-                        if configRotation == 0:
-                            canvas.drawLine(QPointF(0, dotHSize), QPointF(dotSize, dotHSize))
-                        else:
-                            canvas.drawLine(QPointF(-0.5, dotHSize), QPointF(dotSize+0.5, dotHSize))
-                        canvas.restore()
-                    elif configDrawMode == 4:
-                        # soft line
-                        configPen.setWidthF(fRadiusX)
-                        canvas.setPen(configPen)
-
-                        canvas.save()
-                        canvas.translate(fXSrc, fYSrc)
-                        canvas.rotate(configRotationD)
-                        canvas.drawLine(QPointF(0, dotHSize), QPointF(dotSize, dotHSize))
-                        canvas.restore()
-
-                if pProgress is not None:
-                    currentStepnumber += stepInc
-                    if currentStepnumber >= moduloStep:
-                        currentStepnumber = 0
-                        self.progressNext(pProgress)
-
-            canvas.end()
+            # - 8bits RGBA layer: read as an ARGB32 image
+            # - RGBA layer with a higher color depth and a sRGB tone response
+            #   curve: read as an array, without conversion (sampling made
+            #   without quantization)
+            # - otherwise, layer is converted to 8bits RGBA: as halftone replaces
+            #   layer content, layer is not converted back
+            if source is not None:
+                # pixels separated in memory
+                imgSrc = source[0]
+            else:
+                if not (currentProcessedLayer.colorModel() == 'RGBA' and currentProcessedLayer.colorDepth() == 'U8' or
+                        HalftonePixels.isSupported(currentProcessedLayer.colorModel(), currentProcessedLayer.colorDepth(), currentProcessedLayer.colorProfile())):
+                    currentProcessedLayer.setColorSpace("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc")
 
+                if currentProcessedLayer.colorDepth() == 'U8':
+                    imgSrc = EKritaNode.toQImage(currentProcessedLayer)
+                else:
+                    imgSrc = HalftonePixels.toArray(currentProcessedLayer.pixelData(bounds.left(),
+                                                                              bounds.top(),
+                                                                              bounds.width(),
+                                                                              bounds.height()),
+                                                    bounds.width(),
+                                                    bounds.height(),
+                                                    currentProcessedLayer.colorDepth())
+
+            render = self.__halftoneRender(outputOptions, imgSrc, bounds.width(), bounds.height(), color, desaturate, checkCancelled)
+
+            def renderTask():
+                """Render halftone, with progress of render task of color"""
+                key = ('render', color)
+                progress.start(key)
+                returned = render(executorRenderThreads, lambda ratio: workerProgress(key, ratio))
+                progress.done(key)
+                return returned
+
+            return executor.submit(renderTask)
+
+        def applyNewspaperResult(currentProcessedLayer, workingImage, position):
+            """Apply rendered halftone to layer, at given position"""
             # apply result to current processed layer
-            EKritaNode.fromQPixmap(currentProcessedLayer, workingPixmap, QPoint(currentProcessedLayer.bounds().left(), currentProcessedLayer.bounds().top()))
+            # (image is given as is, without conversion to a QPixmap)
+            if currentProcessedLayer.colorDepth() != 'U8' and HalftonePixels.isSupported(currentProcessedLayer.colorModel(), currentProcessedLayer.colorDepth(), currentProcessedLayer.colorProfile()):
+                # written in layer color depth: no conversion of layer
+                currentProcessedLayer.setPixelData(HalftonePixels.fromImage(workingImage, currentProcessedLayer.colorDepth()),
+                                                   position.x(),
+                                                   position.y(),
+                                                   workingImage.width(),
+                                                   workingImage.height())
+            else:
+                EKritaNode.fromQImage(currentProcessedLayer, workingImage, position)
 
-            if self.__outputOptions['outputAntialasing'] == OUTPUT_ANTIALIASING_SOFT:
+            if outputOptions['outputAntialasing'] == OUTPUT_ANTIALIASING_SOFT:
                 filter = Application.filter("gaussian blur")
                 filterConfiguration = filter.configuration()
                 filterConfiguration.setProperty("horizRadius", 0.67)
                 filterConfiguration.setProperty("vertRadius", 0.67)
                 filterConfiguration.setProperty("lockAspect", True)
                 filter.setConfiguration(filterConfiguration)
-                filter.apply(currentProcessedLayer, 0, 0, configWidth, configHeight)
-
-            # if not pProgress is None:
-            #    print(f"Newspaper execution duration[{color}]:", time.time() - startTime)
+                filter.apply(currentProcessedLayer, position.x(), position.y(), workingImage.width(), workingImage.height())
 
             return currentProcessedLayer
 
+        def startNewspaper(currentProcessedLayer, value, color, source=None, desaturate=None):
+            """Start rendering of halftone for layer in worker threads
+
+            If layers are not rendered concurrently, wait for result
+            """
+            pendingNewspaper[color] = (applyNewspaper(currentProcessedLayer, value, color, source, desaturate),
+                                       currentProcessedLayer,
+                                       currentProcessedLayer.bounds().topLeft() if source is None else source[1].topLeft())
+            if not renderConcurrently:
+                applyPendingNewspaper([color])
+
+        def applyPendingNewspaper(colors):
+            """Wait for halftone rendered in worker threads for given layers colors,
+            and apply results to layers
+            """
+            pending = {pendingNewspaper[color][0]: color for color in colors if color in pendingNewspaper}
+
+            progress.pause()
+            try:
+                for future in waitFutures(list(pending)):
+                    color = pending.pop(future)
+                    layer, position = pendingNewspaper.pop(color)[1:]
+                    applyNewspaperResult(layer, future.result(), position)
+            finally:
+                progress.resume()
+
+        def checkCancelled():
+            """Raise NewspaperCancelled if user asked to cancel process"""
+            if cancelled.is_set():
+                raise NewspaperCancelled()
+
+        def workerProgress(key, ratio):
+            """Progress callback for worker threads
+
+            Progress bar can't be updated outside main thread: ratio is stored
+            and applied by main thread while waiting for workers
+            """
+            checkCancelled()
+            progress.update(key, ratio)
+
+        def stepDone(key):
+            """Set a main thread task done, and update progress bar"""
+            progress.done(key)
+            progress.refresh()
+            checkCancelled()
+
+        def waitFutures(futures):
+            """Iterate on given futures as they're done
+
+            While waiting, main thread update progress bar and check if process
+            has been cancelled
+            """
+            pending = futures
+            while len(pending) > 0:
+                done, pending = wait(pending, timeout=NewspaperProgress.REFRESH_INTERVAL, return_when=FIRST_COMPLETED)
+                progress.refresh()
+                checkCancelled()
+                for future in done:
+                    yield future
+
+        def runInWorker(function, *args):
+            """Execute function in a worker thread and return result"""
+            future = executor.submit(function, *args)
+            for done in waitFutures([future]):
+                return done.result()
+
         def parseLayerName(value, color):
             """Parse layer name"""
 
@@ -2614,94 +3421,275 @@ class Newspaper(Extension):
 
             return returned
 
+        def canSeparateInMemory(plan):
+            """Return True if layers for current output mode can be built in memory"""
+            return (self.__processInMemory and
+                    NUMPY_AVAILABLE and
+                    plan.isValid() and
+                    document.colorModel() == 'RGBA' and document.colorDepth() == 'U8' and
+                    originalLayer.colorModel() == 'RGBA' and originalLayer.colorDepth() == 'U8' and
+                    originalLayer.colorProfile() == document.colorProfile())
+
+        def maskLayers(selection):
+            """Mask paint layers of group with given selection, for processed bounds"""
+            selectionData = selection.pixelData(processBounds.left(), processBounds.top(), processBounds.width(), processBounds.height())
+
+            for layer in parentGroupLayer.childNodes():
+                if layer.type() == 'paintlayer':
+                    layer.setPixelData(HalftoneSeparation.maskPixelData(layer.pixelData(processBounds.left(), processBounds.top(), processBounds.width(), processBounds.height()), selectionData),
+                                       processBounds.left(),
+                                       processBounds.top(),
+                                       processBounds.width(),
+                                       processBounds.height())
+
+        def readPixels(layer):
+            """Return pixels array of layer, for processed bounds"""
+            return HalftoneSeparation.fromPixelData(layer.pixelData(processBounds.left(), processBounds.top(), processBounds.width(), processBounds.height()),
+                                                    processBounds.width(),
+                                                    processBounds.height())
+
+        def createLayer(color, pixels):
+            """Create a paint layer in group, on top of group, with given pixels
+            array (if any) of processed bounds"""
+            newLayer = document.createNode(parseLayerName(outputOptions['layerColorName'], color), "paintlayer")
+            parentGroupLayer.addChildNode(newLayer, None)
+
+            if pixels is not None:
+                bounds = HalftoneSeparation.bounds(pixels)
+                if bounds is not None:
+                    x, y, width, height = bounds
+                    newLayer.setPixelData(HalftoneSeparation.toPixelData(pixels[y:y+height, x:x+width]),
+                                          processBounds.left() + x,
+                                          processBounds.top() + y,
+                                          width,
+                                          height)
+
+            return newLayer
+
+        def separateInMemory(plan):
+            """Build layers for current output mode from execution plan
+
+            Layers processes are made in memory on pixels arrays: original
+            pixels are read once, and only final layers are created in document
+            """
+            # key = color, value = layer created in document
+            colorLayers = {}
+
+            def inputs(key):
+                """Return pixels of input operation of plan"""
+                if key[0] == 'original':
+                    return readPixels(originalLayer)
+                elif key[0] == 'ink':
+                    return HalftoneSeparation.fromPixelData(inkPixelData(key[1]), processBounds.width(), processBounds.height())
+
+                # content of layer is halftone, wait for it if currently rendered
+                applyPendingNewspaper([key[1]])
+                return readPixels(colorLayers[key[1]])
+
+            def calculate(key):
+                """Return pixels of operation and their bounds
+
+                Inputs are read from main thread (Krita API), calculation is
+                made in a worker thread
+                """
+                inputsPixels = {inputKey: inputs(inputKey) for inputKey in plan.inputKeys(key)}
+
+                def pixelsBounds():
+                    pixels = plan.pixels(key, processBounds.width(), processBounds.height(), inputsPixels.get)
+                    return (pixels, HalftoneSeparation.bounds(pixels))
+
+                return runInWorker(pixelsBounds)
+
+            for index, step in enumerate(plan.steps()):
+                progress.start(('step', index))
+                if step['action'] == 'newspaper':
+                    pixels, bounds = calculate(step['source'])
+                    colorLayers[step['color']] = createLayer(step['color'], None)
+
+                    if bounds is None:
+                        # nothing to render
+                        progress.done(('render', step['color']))
+                    else:
+                        x, y, width, height = bounds
+                        source = (pixels[y:y+height, x:x+width], QRect(processBounds.left() + x, processBounds.top() + y, width, height))
+                        startNewspaper(colorLayers[step['color']], step['value'], step['color'], source, step['desaturate'])
+                elif step['action'] == 'create':
+                    colorLayers[step['color']] = createLayer(step['color'], calculate(step['source'])[0])
+                elif step['action'] == 'properties':
+                    colorLayers[step['color']].setBlendingMode(step['blendingMode'])
+                    colorLayers[step['color']].setOpacity(step['opacity'])
+                elif step['action'] == 'remove':
+                    colorLayers.pop(step['color']).remove()
+
+                # pixels not needed anymore by next steps are released
+                plan.stepDone(index)
+                stepDone(('step', index))
+
+            plan.clear()
+
         if document is None or originalLayer is None:
             # should not occurs, but...
             return
 
-        outputMode = self.__outputOptions['outputMode']
-        if outputMode == OUTPUT_MODE_MONO:
-            if self.__outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_LIGHTNESS:
-                outputMode += '0'
-            elif self.__outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_LUMINOSITY709:
-                outputMode += '1'
-            elif self.__outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_LUMINOSITY601:
-                outputMode += '2'
-            elif self.__outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_AVERAGE:
-                outputMode += '3'
-            elif self.__outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_MINIMUM:
-                outputMode += '4'
-            elif self.__outputOptions['outputMonoDesaturateMode'] == OUTPUT_MONO_DESMODE_MAXIMUM:
-                outputMode += '5'
+        outputMode = self.__outputModeKey(outputOptions)
+        outputModeLayers = self.__outputModeLayers(outputMode)
+
+        # processed area: original layer content, with a margin of one dot
+        # (layers built from fill layers are not processed on whole document)
+        processMargin = ceil(max(outputOptions['outputSize'], outputOptions['outputSize'] * (1 + outputOptions['outputAdjustment'] / 100)))
+        processBounds = originalLayer.bounds().adjusted(-processMargin, -processMargin, processMargin, processMargin).intersected(QRect(0, 0, document.width(), document.height()))
+
+        # with an active selection, only selection bounding box is processed
+        # and result is masked by selection
+        processSelection = document.selection()
+        if processSelection is not None:
+            processBounds = processBounds.intersected(QRect(processSelection.x(), processSelection.y(), processSelection.width(), processSelection.height()))
+
+        if processBounds.isEmpty():
+            # selection doesn't overlap layer content, or layer is empty:
+            # nothing to process, document is left untouched
+            return None
 
-        if pProgress is not None:
-            # determinate number of steps
-            stepTotal = 4
-            for layer in OUTPUT_MODE_NFO[outputMode]['layers']:
-                stepTotal += len(layer['process'])
-                for process in layer['process']:
-                    if process['action'] in ['newspaper', 'uncolorise']:
-                        # arbitrary decompose a newspaper action to 20steps
-                        # otherwise progress bar seems to be freezed during
-                        # process
-                        stepTotal += 20
+        # compiled layers processes, if they can be made in memory
+        plan = HalftoneSeparationPlan(outputModeLayers, (originalLayer.blendingMode(), originalLayer.opacity()))
+        if not canSeparateInMemory(plan):
+            plan = None
+
+        # tasks of process, weighted by their cost
+        progress = NewspaperProgress(pProgress, outputOptions['outputMode'])
+        processPixels = processBounds.width() * processBounds.height()
+        progress.addTask(('group',), NewspaperProgress.KIND_LAYER)
+        if plan is not None:
+            for index, step in enumerate(plan.steps()):
+                if step['action'] in ('newspaper', 'create'):
+                    progress.addTask(('step', index), NewspaperProgress.KIND_SEPARATE, processPixels)
+                else:
+                    progress.addTask(('step', index), NewspaperProgress.KIND_LAYER)
 
-            pProgress.setRange(0, stepTotal)
+                if step['action'] == 'newspaper':
+                    progress.addTask(('render', step['color']), NewspaperProgress.KIND_RENDER, processPixels, parseLayerName('{color:long}', step['color']) or step['color'])
+        else:
+            for layerIndex, layer in enumerate(outputModeLayers):
+                for processIndex, process in enumerate(layer['process']):
+                    progress.addTask(('step', layerIndex, processIndex), NewspaperProgress.KIND_LAYER)
+
+                    if process['action'] == 'newspaper':
+                        progress.addTask(('render', layer['color']), NewspaperProgress.KIND_RENDER, processPixels, parseLayerName('{color:long}', layer['color']) or layer['color'])
+        progress.addTask(('finish',), NewspaperProgress.KIND_LAYER)
+
+        # cancellation asked from progress dialog
+        # checked by main thread while waiting for workers, and by workers on
+        # each progress update
+        if pCancelled is None:
+            cancelled = Event()
+        else:
+            cancelled = pCancelled
+        if isinstance(pProgress, QProgressDialog):
+            pProgress.canceled.connect(cancelled.set)
 
         if originalLayerIsVisible is False:
             originalLayer.setVisible(True)
 
         # ----------------------------------------------------------------------
         # Create new group layer
-        parentGroupLayer = document.createGroupLayer(parseLayerName(self.__outputOptions['layerGroupName'], ''))
+        progress.start(('group',))
+        parentGroupLayer = document.createGroupLayer(parseLayerName(outputOptions['layerGroupName'], ''))
         originalLayer.parentNode().addChildNode(parentGroupLayer, originalLayer)
 
-        self.progressNext(pProgress)
+        progress.done(('group',))
+        progress.refresh()
 
         currentProcessedLayer = None
 
-        for layer in OUTPUT_MODE_NFO[outputMode]['layers']:
-            currentProcessedLayer = getLayerByName(parentGroupLayer, parseLayerName(self.__outputOptions['layerColorName'], layer['color']))
+        # pixels are processed by worker threads
+        # - Krita API is used from main thread only (layers are built, and then
+        #   results are applied to layers, from main thread)
+        # - in CMY/CMYK modes, halftone for color layers can be rendered in
+        #   parallel
+        # key = layer color, value = (future, layer, position)
+        pendingNewspaper = {}
+
+        # pixels data of original layer converted to CMYK, if needed
+        separationCache = {}
+        nbNewspaperLayers = len([layer for layer in outputModeLayers
+                                 if 'newspaper' in [process['action'] for process in layer['process']]])
+        renderConcurrently = self.__renderChannelsConcurrently and nbNewspaperLayers > 1
+        if renderConcurrently:
+            # one more worker for separation calculated while layers are rendered
+            executor = ThreadPoolExecutor(max_workers=nbNewspaperLayers + 1)
+            # threads used to render strips are shared between layers rendered in parallel
+            executorRenderThreads = max(1, HalftoneRenderer.idealThreadCount(self.__renderThreads) // nbNewspaperLayers)
+        else:
+            executor = ThreadPoolExecutor(max_workers=1)
+            executorRenderThreads = self.__renderThreads
 
-            for process in layer['process']:
-                if process['action'] == 'duplicate':
-                    currentProcessedLayer = duplicateLayer(currentProcessedLayer, process['value'])
-                elif process['action'] == 'new':
-                    currentProcessedLayer = newLayer(currentProcessedLayer, process['value'])
-                elif process['action'] == 'remove':
-                    currentProcessedLayer = removeLayer(currentProcessedLayer, process['value'])
-                elif process['action'] == 'merge down':
-                    currentProcessedLayer = mergeDown(currentProcessedLayer, process['value'])
-                elif process['action'] == 'blending mode':
-                    applyBlendingMode(currentProcessedLayer, process['value'])
-                elif process['action'] == 'opacity':
-                    applyOpacity(currentProcessedLayer, process['value'])
-                elif process['action'] == 'filter':
-                    applyFilter(currentProcessedLayer, process['value'])
-                elif process['action'] == 'newspaper':
-                    applyNewspaper(currentProcessedLayer, process['value'], layer['color'])
-
-                self.progressNext(pProgress)
-
-            if currentProcessedLayer is not None:
-                # rename currentProcessedLayer
-                currentProcessedLayer.setName(parseLayerName(self.__outputOptions['layerColorName'], layer['color']))
-
-        self.progressNext(pProgress)
-
-        if self.__outputOptions['originalLayerAction'] == ORIGINAL_LAYER_KEEPVISIBLE:
+        try:
+            if plan is not None:
+                # no intermediate layers
+                separateInMemory(plan)
+            else:
+                for layerIndex, layer in enumerate(outputModeLayers):
+                    currentProcessedLayer = getLayerByName(parentGroupLayer, parseLayerName(outputOptions['layerColorName'], layer['color']))
+
+                    for processIndex, process in enumerate(layer['process']):
+                        progress.start(('step', layerIndex, processIndex))
+                        if process['action'] == 'duplicate':
+                            currentProcessedLayer = duplicateLayer(currentProcessedLayer, process['value'])
+                        elif process['action'] == 'new':
+                            currentProcessedLayer = newLayer(currentProcessedLayer, process['value'])
+                        elif process['action'] == 'separate':
+                            currentProcessedLayer = separateLayer(currentProcessedLayer, process['value'])
+                        elif process['action'] == 'remove':
+                            currentProcessedLayer = removeLayer(currentProcessedLayer, process['value'])
+                        elif process['action'] == 'merge down':
+                            currentProcessedLayer = mergeDown(currentProcessedLayer, process['value'])
+                        elif process['action'] == 'blending mode':
+                            applyBlendingMode(currentProcessedLayer, process['value'])
+                        elif process['action'] == 'opacity':
+                            applyOpacity(currentProcessedLayer, process['value'])
+                        elif process['action'] == 'filter':
+                            applyFilter(currentProcessedLayer, process['value'])
+                        elif process['action'] == 'newspaper':
+                            startNewspaper(currentProcessedLayer, process['value'], layer['color'], desaturate=process.get('desaturate'))
+
+                        stepDone(('step', layerIndex, processIndex))
+
+                    if currentProcessedLayer is not None:
+                        # rename currentProcessedLayer
+                        currentProcessedLayer.setName(parseLayerName(outputOptions['layerColorName'], layer['color']))
+
+            applyPendingNewspaper(list(pendingNewspaper.keys()))
+        except NewspaperCancelled:
+            # workers stop on their next progress step, rendering not started
+            # is abandoned; built layers are removed
+            for pending in pendingNewspaper.values():
+                pending[0].cancel()
+            executor.shutdown()
+
+            parentGroupLayer.remove()
+            originalLayer.setVisible(originalLayerIsVisible)
+            document.refreshProjection()
+            return None
+
+        executor.shutdown()
+
+        progress.start(('finish',))
+        if processSelection is not None and not processBounds.isEmpty():
+            maskLayers(processSelection)
+
+        if outputOptions['originalLayerAction'] == ORIGINAL_LAYER_KEEPVISIBLE:
             originalLayer.setVisible(True)
-        elif self.__outputOptions['originalLayerAction'] == ORIGINAL_LAYER_KEEPHIDDEN:
+        elif outputOptions['originalLayerAction'] == ORIGINAL_LAYER_KEEPHIDDEN:
             originalLayer.setVisible(False)
-        elif self.__outputOptions['originalLayerAction'] == ORIGINAL_LAYER_REMOVE:
+        elif outputOptions['originalLayerAction'] == ORIGINAL_LAYER_REMOVE:
             originalLayer.remove()
         else:
             # ORIGINAL_LAYER_KEEPUNCHANGED
             originalLayer.setVisible(originalLayerIsVisible)
 
-        self.progressNext(pProgress)
-
         document.refreshProjection()
-        self.progressNext(pProgress)
+        progress.done(('finish',))
+        progress.refresh(True)
 
         document.setActiveNode(parentGroupLayer)
 
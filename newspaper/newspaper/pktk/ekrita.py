@@ -278,6 +278,10 @@ class EKritaNode:
         - None, in this case will return all `layerNode` content
         - A QRect() object, in this case return `layerNode` content reduced to given rectangle bounds
         - A Krita document, in this case return `layerNode` content reduced to document bounds
+
+        Returned image doesn't copy pixels data returned by Krita, but is built
+        on it: image is read-only, and calling bits() on it (instead of
+        constBits()) will make a deep copy of pixels data
         """
         if not isinstance(layerNode, Node):
             raise EInvalidType("Given `layerNode` must be a valid Krita <Node> ")
@@ -324,6 +328,9 @@ class EKritaNode:
         The `position` value can be:
         - None, in this case, pixmap will be pasted at position (0, 0)
         - A QPoint() object, pixmap will be pasted at defined position
+
+        If `image` format is ARGB32, image pixels data are given to Krita without
+        any copy; otherwise image is converted to ARGB32 first
         """
         if not isinstance(layerNode, Node):
             raise EInvalidType("Given `layerNode` must be a valid Krita <Node> ")
@@ -346,10 +353,16 @@ class EKritaNode:
             layerNode.setColorSpace("RGBA", "U8", "sRGB-elle-V2-srgbtrc.icc")
             layerNeedBackConversion=True
 
-        ptr = image.bits()
+        if image.format() != QImage.Format_ARGB32:
+            # Krita expect non premultiplied BGRA pixels
+            image = image.convertToFormat(QImage.Format_ARGB32)
+
+        # use constBits() to avoid a detach (deep copy) of shared image data
+        # and a QByteArray built on raw data to avoid copy of pixels data
+        ptr = image.constBits()
         ptr.setsize(image.byteCount())
 
-        layerNode.setPixelData(QByteArray(ptr.asstring()), position.x(), position.y(), image.width(), image.height())
+        layerNode.setPixelData(QByteArray.fromRawData(ptr), position.x(), position.y(), image.width(), image.height())
 
         if layerNeedBackConversion:
             layerNode.setColorSpace(layerColorModel, layerColorDepth, layerColorProfile)
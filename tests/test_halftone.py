@@ -0,0 +1,223 @@
+# -----------------------------------------------------------------------------
+# Newspaper
+# Copyright (C) 2019-2002 - Grum999
+# -----------------------------------------------------------------------------
+# SPDX-License-Identifier: GPL-3.0-or-later
+#
+# https://spdx.org/licenses/GPL-3.0-or-later.html
+# -----------------------------------------------------------------------------
+# Tests for halftone module (no Krita needed)
+#
+# Run from repository root:
+#   python -m unittest discover -s tests
+# -----------------------------------------------------------------------------
+
+from math import (
+        ceil,
+        cos,
+        radians,
+        sin
+    )
+import os
+import os.path
+import sys
+import unittest
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'newspaper', 'newspaper'))
+
+from PyQt5.QtCore import (
+        QByteArray,
+        Qt
+    )
+from PyQt5.QtGui import (
+        QBrush,
+        QColor,
+        QGuiApplication,
+        QImage,
+        QPainter,
+        QPen
+    )
+
+import numpy
+
+import halftone
+from halftone import (
+        HalftoneJitter,
+        HalftoneRenderer,
+        HalftoneSampler,
+        HalftoneSeparation
+    )
+
+
+APPLICATION = QGuiApplication.instance() or QGuiApplication([])
+
+
+def sourceImage(width, height, gray):
+    """Return an ARGB32 image filled with random pixels (gray pixels if
+    `gray` is True), and a transparent area"""
+    pixels = numpy.random.default_rng(42).integers(0, 256, (height, width, 4), dtype=numpy.uint8)
+    if gray:
+        pixels[:, :, 1] = pixels[:, :, 0]
+        pixels[:, :, 2] = pixels[:, :, 0]
+    pixels[:, :, 3] = 255
+    pixels[:height // 4, :width // 4] = 0
+
+    returned = QImage(width, height, QImage.Format_ARGB32)
+    HalftoneSampler.imageArray(returned, True)[:] = pixels
+    return returned
+
+
+def lattice(width, height, dotSize, rotation):
+    """Return lattice positions and transform matrix for given rotation (in
+    degree), like newspaper process"""
+    dotiHSize = int(dotSize / 2)
+
+    if rotation == 0:
+        return ([(-dotiHSize + dotSize * v) for v in range(ceil((width + 2 * dotiHSize) / dotSize))],
+                [(-dotiHSize + dotSize * v) for v in range(ceil((height + 2 * dotiHSize) / dotSize))],
+                None)
+
+    rotCos = cos(-radians(rotation))
+    rotSin = sin(-radians(rotation))
+    transformMatrix = [[rotCos, -rotSin, width / 2],
+                       [rotSin, rotCos, height / 2]]
+
+    xLeft = min(0, HalftoneSampler.transform(0, 0, transformMatrix)[0])
+    xRight = max(width, HalftoneSampler.transform(width, height, transformMatrix)[0])
+    yTop = min(0, HalftoneSampler.transform(width, 0, transformMatrix)[1])
+    yBottom = max(height, HalftoneSampler.transform(0, height, transformMatrix)[1])
+
+    return ([(xLeft + dotSize * v) for v in range(ceil((xRight - xLeft) / dotSize))],
+            [(yTop + dotSize * v) for v in range(ceil((yBottom - yTop) / dotSize))],
+            transformMatrix)
+
+
+class TestHalftoneSampler(unittest.TestCase):
+    """NumPy and pure python sampling must provide the same dots"""
+
+    def assertSameDots(self, imgSrc, dotSize, rotation, sampling, desaturate=None):
+        xPositions, yPositions, transformMatrix = lattice(imgSrc.width(), imgSrc.height(), dotSize, rotation)
+
+        dotsPython = HalftoneSampler.samplePython(imgSrc, xPositions, yPositions, transformMatrix, dotSize, sampling, desaturate)
+        dotsNumPy = HalftoneSampler.sampleNumPy(imgSrc, xPositions, yPositions, transformMatrix, dotSize, sampling, None, desaturate)
+
+        for valuesPython, valuesNumPy in zip(dotsPython, dotsNumPy):
+            self.assertEqual(len(valuesPython), len(valuesNumPy))
+            self.assertTrue(numpy.array_equal(numpy.array(valuesPython), valuesNumPy))
+
+    def test_sampling(self):
+        imgSrc = sourceImage(97, 61, True)
+        for dotSize in (3, 8):
+            for rotation in (0, 15, 45):
+                for sampling in (HalftoneSampler.SAMPLING_LOW, HalftoneSampler.SAMPLING_MEDIUM, HalftoneSampler.SAMPLING_HIGH):
+                    with self.subTest(dotSize=dotSize, rotation=rotation, sampling=sampling):
+                        self.assertSameDots(imgSrc, dotSize, rotation, sampling)
+
+    def test_samplingDesaturate(self):
+        imgSrc = sourceImage(97, 61, False)
+        for desaturate in range(HalftoneSeparation.DESATURATE_LIGHTNESS, HalftoneSeparation.DESATURATE_MAXIMUM + 1):
+            for sampling in (HalftoneSampler.SAMPLING_LOW, HalftoneSampler.SAMPLING_HIGH):
+                with self.subTest(desaturate=desaturate, sampling=sampling):
+                    self.assertSameDots(imgSrc, 8, 45, sampling, desaturate)
+
+
+class TestHalftoneRenderer(unittest.TestCase):
+    """Threaded rendering must provide the same image than serial rendering"""
+
+    WIDTH = 203
+    HEIGHT = 311
+
+    def render(self, renderer, dots, threads):
+        bgColor = QColor(Qt.white)
+        returned = QImage(TestHalftoneRenderer.WIDTH, TestHalftoneRenderer.HEIGHT, QImage.Format_ARGB32_Premultiplied)
+        returned.fill(bgColor)
+
+        canvas = QPainter()
+        canvas.begin(returned)
+        if threads == 1:
+            renderer.paint(canvas, *dots)
+        else:
+            renderer.paintThreaded(canvas, TestHalftoneRenderer.WIDTH, TestHalftoneRenderer.HEIGHT, bgColor, *dots, threads)
+        canvas.end()
+        return returned
+
+    def test_paintThreaded(self):
+        imgSrc = sourceImage(TestHalftoneRenderer.WIDTH, TestHalftoneRenderer.HEIGHT, True)
+        dotSize = 8
+        xPositions, yPositions, transformMatrix = lattice(imgSrc.width(), imgSrc.height(), dotSize, 15)
+        dotsX, dotsY, dotsCoverage = HalftoneSampler.sample(imgSrc, xPositions, yPositions, transformMatrix, dotSize, HalftoneSampler.SAMPLING_MEDIUM)
+
+        color = QColor(Qt.black)
+        for drawMode in (HalftoneRenderer.DRAW_MODE_CIRCLE,
+                         HalftoneRenderer.DRAW_MODE_DIAMOND,
+                         HalftoneRenderer.DRAW_MODE_SQUARE,
+                         HalftoneRenderer.DRAW_MODE_LINEFLAT,
+                         HalftoneRenderer.DRAW_MODE_LINEROUND):
+            if drawMode in (HalftoneRenderer.DRAW_MODE_LINEFLAT, HalftoneRenderer.DRAW_MODE_LINEROUND):
+                brush = QBrush(Qt.NoBrush)
+                pen = QPen(color)
+            else:
+                brush = QBrush(color, Qt.SolidPattern)
+                pen = QPen(Qt.NoPen)
+
+            for steadiness in (10, 5):
+                with self.subTest(drawMode=drawMode, steadiness=steadiness):
+                    renderer = HalftoneRenderer(drawMode, brush, pen, True, dotSize, 1, radians(15), -15)
+                    dots = (dotsX, dotsY) + renderer.radius(dotsCoverage, steadiness, dotsX, dotsY, 3)
+
+                    self.assertEqual(self.render(renderer, dots, 1), self.render(renderer, dots, 4))
+
+
+class TestHalftoneJitter(unittest.TestCase):
+    """Dots variations must be reproducible"""
+
+    def test_values(self):
+        rng = numpy.random.default_rng(7)
+        dotsX = rng.uniform(-50, 500, 1000)
+        dotsY = rng.uniform(-50, 500, 1000)
+
+        values = HalftoneJitter.values(dotsX, dotsY, 12, 0)
+
+        # same seed: same values, whatever the implementation or dots order
+        self.assertTrue(numpy.array_equal(values, HalftoneJitter.values(dotsX.copy(), dotsY.copy(), 12, 0)))
+        self.assertEqual(values.tolist(), HalftoneJitter.values(dotsX.tolist(), dotsY.tolist(), 12, 0))
+        self.assertTrue(numpy.array_equal(values[::-1], HalftoneJitter.values(dotsX[::-1], dotsY[::-1], 12, 0)))
+
+        self.assertTrue(((values >= 0) & (values < 1)).all())
+
+        # others seeds and streams provide others values
+        self.assertFalse(numpy.array_equal(values, HalftoneJitter.values(dotsX, dotsY, 13, 0)))
+        self.assertFalse(numpy.array_equal(values, HalftoneJitter.values(dotsX, dotsY, 12, 1)))
+
+
+class TestHalftoneSeparation(unittest.TestCase):
+    """Pixels processed in memory must be the same with or without NumPy"""
+
+    def test_maskPixelData(self):
+        # process of a selection: alpha channel is multiplied by selection,
+        # colors are unchanged
+        rng = numpy.random.default_rng(3)
+        pixels = rng.integers(0, 256, (500, 4), dtype=numpy.uint8)
+        selection = rng.integers(0, 256, 500, dtype=numpy.uint8)
+        selection[:50] = 0
+        selection[50:100] = 255
+
+        dataNumPy = HalftoneSeparation.maskPixelData(QByteArray(pixels.tobytes()), QByteArray(selection.tobytes()))
+        halftone.NUMPY_AVAILABLE = False
+        try:
+            dataPython = HalftoneSeparation.maskPixelData(QByteArray(pixels.tobytes()), QByteArray(selection.tobytes()))
+        finally:
+            halftone.NUMPY_AVAILABLE = True
+
+        self.assertEqual(bytes(dataNumPy), bytes(dataPython))
+
+        masked = numpy.frombuffer(bytes(dataNumPy), dtype=numpy.uint8).reshape(-1, 4)
+        self.assertTrue(numpy.array_equal(masked[:, :3], pixels[:, :3]))
+        self.assertTrue(numpy.array_equal(masked[:, 3], numpy.round(pixels[:, 3] * selection.astype(numpy.int32) / 255)))
+        self.assertFalse(masked[:50, 3].any())
+        self.assertTrue(numpy.array_equal(masked[50:100], pixels[50:100]))
+
+
+if __name__ == '__main__':
+    unittest.main()